@@ -1,9 +1,9 @@
 import cv2
 import albumentations as A
 
-def get_augmentation(image):    
-
-    transform = A.Compose([
+def build_transform():
+    """Augmentation pipeline'ını kurar. Tekrar tekrar çağırmak yerine bir kez kurup saklayın."""
+    return A.Compose([
         A.OneOf([
             A.ElasticTransform(p=0.5, alpha=1, sigma=50, alpha_affine=50), # Elastik bükme
             A.GridDistortion(p=0.5, num_steps=5, distort_limit=0.1),       # Izgara bükme
@@ -26,6 +26,10 @@ def get_augmentation(image):
         A.CoarseDropout(max_holes=1, max_height=16, max_width=16, p=0.2),
     ])
 
+def get_augmentation(image, transform=None):    
+    if transform is None:
+        transform = build_transform()
+
     # Dönüştürme işlemini yap
     result = transform(image=image)
     return result['image']
@@ -0,0 +1,102 @@
+import time
+import numpy as np
+import box_ops
+
+# Tipik bir panoramik: Stage 2 conf=0.05 ile yüzlerce kutu, 4 quadrant, ~30 GT hastalık kutusu
+N_PRED = 300
+N_GT = 30
+N_QUAD = 4
+REPEAT = 20
+
+
+# --- Eski, çift döngülü saf Python uygulamalar (karşılaştırma için) ---
+def loop_iou(boxes_a, boxes_b):
+    out = []
+    for b1 in boxes_a:
+        row = []
+        for b2 in boxes_b:
+            x1 = max(b1[0], b2[0]); y1 = max(b1[1], b2[1])
+            x2 = min(b1[2], b2[2]); y2 = min(b1[3], b2[3])
+            inter = max(0, x2 - x1) * max(0, y2 - y1)
+            union = (b1[2] - b1[0]) * (b1[3] - b1[1]) + (b2[2] - b2[0]) * (b2[3] - b2[1]) - inter
+            row.append(inter / union if union > 0 else 0)
+        out.append(row)
+    return out
+
+
+def loop_strict_overlap(pred_boxes, gt_boxes):
+    sick = []
+    for p in pred_boxes:
+        is_sick = False
+        for d in gt_boxes:
+            x_overlap = max(0, min(p[2], d[2]) - max(p[0], d[0]))
+            y_overlap = max(0, min(p[3], d[3]) - max(p[1], d[1]))
+            if x_overlap * y_overlap > 0:
+                is_sick = True
+                break
+        sick.append(is_sick)
+    return sick
+
+
+def loop_containment(tooth_boxes, quad_boxes):
+    assigned = []
+    for t in tooth_boxes:
+        cx, cy = (t[0] + t[2]) / 2, (t[1] + t[3]) / 2
+        idx = -1
+        for j, (ox1, oy1, ox2, oy2) in enumerate(quad_boxes):
+            if (ox1 < cx < ox2) and (oy1 < cy < oy2):
+                idx = j
+                break
+        assigned.append(idx)
+    return assigned
+
+
+def loop_coco_to_yolo(boxes, width, height):
+    return [((x + w / 2) / width, (y + h / 2) / height, w / width, h / height) for x, y, w, h in boxes]
+
+
+def _random_boxes(rng, n, max_xy=2800, max_wh=250):
+    xy = rng.uniform(0, max_xy, (n, 2))
+    return np.c_[xy, xy + rng.uniform(5, max_wh, (n, 2))]
+
+
+def _time(fn, *args):
+    start = time.perf_counter()
+    for _ in range(REPEAT):
+        fn(*args)
+    return (time.perf_counter() - start) / REPEAT * 1000
+
+
+def main():
+    rng = np.random.default_rng(0)
+    pred = _random_boxes(rng, N_PRED)
+    gt = _random_boxes(rng, N_GT)
+    quads = _random_boxes(rng, N_QUAD, max_xy=1500, max_wh=1400)
+    xywh = box_ops.xyxy_to_xywh(pred)
+
+    pred_l, gt_l, quads_l, xywh_l = pred.tolist(), gt.tolist(), quads.tolist(), xywh.tolist()
+
+    # Sonuçlar aynı mı?
+    assert np.allclose(loop_iou(pred_l, gt_l), box_ops.iou_matrix(pred, gt))
+    assert loop_strict_overlap(pred_l, gt_l) == list((box_ops.intersection_matrix(pred, gt) > 0).any(axis=1))
+    inside = box_ops.centers_inside(pred, quads)
+    assert loop_containment(pred_l, quads_l) == list(np.where(inside.any(axis=1), inside.argmax(axis=1), -1))
+    assert np.allclose(loop_coco_to_yolo(xywh_l, 3000, 1500), box_ops.xywh_to_yolo(xywh, 3000, 1500))
+
+    cases = [
+        (f"IoU matrisi ({N_PRED}x{N_GT})", (loop_iou, pred_l, gt_l), (box_ops.iou_matrix, pred, gt)),
+        (f"Strict overlap ({N_PRED}x{N_GT})", (loop_strict_overlap, pred_l, gt_l),
+         (lambda a, b: (box_ops.intersection_matrix(a, b) > 0).any(axis=1), pred, gt)),
+        (f"Containment ({N_PRED}x{N_QUAD})", (loop_containment, pred_l, quads_l), (box_ops.centers_inside, pred, quads)),
+        (f"COCO->YOLO ({N_PRED})", (loop_coco_to_yolo, xywh_l, 3000, 1500), (box_ops.xywh_to_yolo, xywh, 3000, 1500)),
+    ]
+
+    print(f"{'İşlem':<28}{'Döngü (ms)':>12}{'NumPy (ms)':>12}{'Hızlanma':>10}")
+    for name, (loop_fn, *loop_args), (vec_fn, *vec_args) in cases:
+        t_loop = _time(loop_fn, *loop_args)
+        t_vec = _time(vec_fn, *vec_args)
+        print(f"{name:<28}{t_loop:>12.3f}{t_vec:>12.3f}{t_loop / t_vec:>9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
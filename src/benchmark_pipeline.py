@@ -0,0 +1,229 @@
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import resource
+import itertools
+import subprocess
+import cv2
+import numpy as np
+from main_pipeline import load_models, warmup, analyze_batch, visualize_results, resolve_options, merge_stats
+
+# Üç aşamalı pipeline için uçtan uca benchmark.
+# Her yapılandırma (backend x torch thread x batch boyutu x stage2_mode) için:
+#   - batch başına ve resim başına gecikme p50/p95/p99
+#   - resim/sn, crop/sn
+#   - adım kırılımı (stage1, stage2, assign, filter, crop, stage3, visualize): toplam ve batch başına p50/p95/p99
+#   - resim decode süresi ayrıca (resimler ölçümden önce bir kez okunur, gecikmeye dahil değildir)
+#   - tepe RSS (süreç ömrü boyunca, yapılandırmalar arasında artarak gider)
+# Sonuçlar JSON olarak yazılır; farklı commit'lerin çıktıları karşılaştırılabilir.
+
+SYNTHETIC_SIZE = (2900, 1450)  # Yeni cihazların panoramik boyutu (genişlik, yükseklik)
+DEFAULT_OUTPUT = "../benchmarks/pipeline.json"
+STAGES = ["stage1", "stage2", "assign", "filter", "crop", "stage3", "visualize"]
+
+
+def synthetic_panoramic(seed, size=SYNTHETIC_SIZE):
+    """Hasta verisi olmadan çalışmak için kabaca panoramik benzeri gri resim: çene kavisi boyunca diş şekilleri."""
+    rng = np.random.default_rng(seed)
+    w, h = size
+    img = np.full((h, w), 40, dtype=np.uint8)
+    cv2.ellipse(img, (w // 2, h // 2), (int(w * 0.42), int(h * 0.38)), 0, 0, 360, 90, -1)
+
+    # Üst ve alt çene: 16'şar diş, kavis boyunca
+    for sign in (-1, 1):
+        for k in range(16):
+            t = (k + 0.5) / 16
+            cx = int(w * (0.12 + 0.76 * t))
+            cy = int(h / 2 + sign * (h * 0.12 + h * 0.10 * (2 * t - 1) ** 2))
+            tw, th = int(w * 0.018 + rng.integers(0, w * 0.01)), int(h * 0.13 + rng.integers(0, h * 0.05))
+            cv2.ellipse(img, (cx, cy + sign * th // 2), (tw, th // 2), 0, 0, 360, int(rng.integers(170, 230)), -1)
+            # Bazı dişlere koyu "çürük" lekesi
+            if rng.random() < 0.2:
+                cv2.circle(img, (cx, cy + sign * th // 3), max(3, tw // 3), int(rng.integers(60, 110)), -1)
+
+    noise = rng.normal(0, 8, img.shape)
+    img = np.clip(img.astype(np.float32) + noise, 0, 255).astype(np.uint8)
+    img = cv2.GaussianBlur(img, (5, 5), 0)
+    return cv2.cvtColor(img, cv2.COLOR_GRAY2BGR)
+
+
+def load_images(args):
+    """(resimler, decode süreleri) döndürür. Sentetik resimlerde decode süresi PNG'den okuma ile ölçülür."""
+    images, decode = [], []
+    if args.images:
+        paths = sorted(os.path.join(args.images, f) for f in os.listdir(args.images)
+                       if f.lower().endswith(('.png', '.jpg', '.jpeg')))[:args.limit]
+        for path in paths:
+            t0 = time.perf_counter()
+            img = cv2.imread(path)
+            decode.append(time.perf_counter() - t0)
+            if img is not None:
+                images.append(img)
+    else:
+        size = tuple(int(v) for v in args.size.split("x"))
+        for i in range(args.synthetic):
+            ok, png = cv2.imencode(".png", synthetic_panoramic(i, size))
+            t0 = time.perf_counter()
+            img = cv2.imdecode(png, cv2.IMREAD_COLOR)
+            decode.append(time.perf_counter() - t0)
+            images.append(img)
+    return images, decode
+
+
+def percentiles(values):
+    if not values:
+        return {"p50": None, "p95": None, "p99": None, "mean": None}
+    arr = np.asarray(values, dtype=float) * 1000
+    return {"p50": round(float(np.percentile(arr, 50)), 3), "p95": round(float(np.percentile(arr, 95)), 3),
+            "p99": round(float(np.percentile(arr, 99)), 3), "mean": round(float(arr.mean()), 3)}
+
+
+def peak_rss_mb():
+    # Linux'ta ru_maxrss KB, macOS'ta byte
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(rss / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def set_threads(n):
+    if n:
+        import torch
+        torch.set_num_threads(n)
+
+
+def run_config(images, decode, models, batch_size, options, repeat, visualize):
+    """Bir yapılandırmayı ölçer; resimler repeat kez, batch_size'lık parçalar halinde işlenir."""
+    batch_latency, image_latency = [], []
+    per_batch_stages = {stage: [] for stage in STAGES}
+    totals = {}
+
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for b in range(0, len(images), batch_size):
+            batch = images[b:b + batch_size]
+            stats = {}
+            t0 = time.perf_counter()
+            outputs = analyze_batch(batch, models, options=options, stats=stats)
+            if visualize:
+                v0 = time.perf_counter()
+                for img, pathologies in zip(batch, outputs):
+                    visualize_results(img, pathologies)
+                stats.setdefault("timings", {})["visualize"] = time.perf_counter() - v0
+            elapsed = time.perf_counter() - t0
+
+            batch_latency.append(elapsed)
+            image_latency.extend([elapsed / len(batch)] * len(batch))
+            for stage in STAGES:
+                if stage in stats.get("timings", {}):
+                    per_batch_stages[stage].append(stats["timings"][stage])
+            merge_stats(totals, stats)
+    wall = time.perf_counter() - start
+
+    timings = totals.pop("timings", {})
+    n_images = len(images) * repeat
+    crops = totals.get("classified", 0)
+
+    return {
+        "images": n_images,
+        "wall_s": round(wall, 3),
+        "images_per_s": round(n_images / wall, 2) if wall else None,
+        "crops": crops,
+        "crops_per_s": round(crops / wall, 2) if wall else None,
+        "batch_latency_ms": percentiles(batch_latency),
+        "image_latency_ms": percentiles(image_latency),
+        "decode_ms": percentiles(decode),
+        "stages": {
+            stage: {"total_s": round(timings[stage], 4),
+                    "share": round(timings[stage] / wall, 4) if wall else None,
+                    "per_batch_ms": percentiles(per_batch_stages[stage])}
+            for stage in STAGES if stage in timings
+        },
+        "candidates": totals,
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], stderr=subprocess.DEVNULL,
+                                       cwd=os.path.dirname(os.path.abspath(__file__))).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def parse_args(argv=None):
+    p = argparse.ArgumentParser(description="Üç aşamalı pipeline benchmark'ı")
+    p.add_argument("--images", help="Resim klasörü (verilmezse sentetik panoramikler kullanılır)")
+    p.add_argument("--limit", type=int, default=None, help="Klasörden en fazla bu kadar resim")
+    p.add_argument("--synthetic", type=int, default=16, help="Sentetik resim sayısı")
+    p.add_argument("--size", default="x".join(map(str, SYNTHETIC_SIZE)), help="Sentetik resim boyutu GxY")
+    p.add_argument("--backends", default="pytorch", help="Virgülle: pytorch,onnx,openvino,openvino_int8")
+    p.add_argument("--threads", default="0", help="Virgülle torch thread sayıları (0: değiştirme)")
+    p.add_argument("--batch-sizes", default="1,8", help="Virgülle analyze_batch boyutları")
+    p.add_argument("--modes", default="global", help="Virgülle stage2_mode: global,tiled,quadrant")
+    p.add_argument("--options", default="{}", help="Ek PIPELINE_OPTIONS (JSON)")
+    p.add_argument("--repeat", type=int, default=1, help="Resim setinin kaç kez işleneceği")
+    p.add_argument("--warmup", type=int, default=2, help="Ölçüm öncesi ısınma çalıştırması")
+    p.add_argument("--visualize", action="store_true", help="visualize_results süresini de ölç")
+    p.add_argument("--output", default=DEFAULT_OUTPUT, help="JSON sonuç dosyası")
+    return p.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    images, decode = load_images(args)
+    if not images:
+        print("❌ Ölçülecek resim yok.")
+        return
+
+    extra = json.loads(args.options)
+    configs = list(itertools.product(args.backends.split(","), [int(t) for t in args.threads.split(",")],
+                                     [int(b) for b in args.batch_sizes.split(",")], args.modes.split(",")))
+    print(f"📏 {len(images)} resim, {len(configs)} yapılandırma")
+
+    results, models, loaded = [], None, None
+    for backend, threads, batch_size, mode in configs:
+        if backend != loaded:
+            models, loaded = load_models(backend), backend
+        set_threads(threads)
+        options = resolve_options(dict(extra, stage2_mode=mode))
+
+        warmup(models, runs=args.warmup)
+        for _ in range(args.warmup):
+            analyze_batch(images[:batch_size], models, options=options)
+
+        r = run_config(images, decode, models, batch_size, options, args.repeat, args.visualize)
+        r["config"] = {"backend": backend, "threads": threads, "batch_size": batch_size, "stage2_mode": mode,
+                       "options": extra}
+        results.append(r)
+
+        lat = r["image_latency_ms"]
+        print(f"   {backend:<14} thr={threads:<2} batch={batch_size:<3} {mode:<9} "
+              f"p50={lat['p50']}ms p95={lat['p95']}ms p99={lat['p99']}ms "
+              f"{r['images_per_s']} img/s {r['crops_per_s']} crop/s RSS={r['peak_rss_mb']}MB")
+        for stage, s in r["stages"].items():
+            print(f"      {stage:<10} {s['total_s']:>8.3f}s  {s['share'] * 100:5.1f}%  p50={s['per_batch_ms']['p50']}ms")
+
+    report = {
+        "meta": {
+            "commit": git_commit(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "images": len(images),
+            "source": args.images or f"synthetic {args.size}",
+            "args": vars(args),
+        },
+        "results": results,
+    }
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"\n✅ Sonuçlar: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+import sys
+import time
+import tracemalloc
+import argparse
+import numpy as np
+from main_pipeline import load_models, classify_crops, STAGE3_BATCH_SIZE
+from stage3_fast import get_fast_classifier, supports_fast
+from benchmark_pipeline import synthetic_panoramic, percentiles
+
+# Stage 3 sınıflandırma yollarının karşılaştırması (aynı crop seti):
+#   per_crop -> her crop için ayrı YOLO.predict (eski analyze_image döngüsü)
+#   batched  -> classify_crops: STAGE3_BATCH_SIZE'lık predict çağrıları
+#   fast     -> stage3_fast.FastClassifier: hazır tampon + doğrudan forward
+# Gecikme: tüm crop setinin süresi (p50/p95/p99).
+# Bellek: tracemalloc ile Python/NumPy ayırmaları (çağrı başına blok sayısı ve tepe);
+# torch'un kendi ayırıcısı tracemalloc'a görünmez, tensör ayırmaları bu sayılara dahil değildir.
+
+
+def synthetic_crops(n, seed=0):
+    """Sentetik panoramikten diş boyutlarında crop görünümleri (kaynak resmin dilimleri, kopya değil)."""
+    rng = np.random.default_rng(seed)
+    img = synthetic_panoramic(seed)
+    h, w = img.shape[:2]
+    crops = []
+    for _ in range(n):
+        cw, ch = int(rng.integers(60, 160)), int(rng.integers(150, 320))
+        x, y = int(rng.integers(0, w - cw)), int(rng.integers(0, h - ch))
+        crops.append(img[y:y + ch, x:x + cw])
+    return crops
+
+
+def per_crop(model, crops):
+    return [(r.names[r.probs.top1], r.probs.top1conf.item())
+            for crop in crops for r in model.predict(crop, verbose=False)]
+
+
+def measure(fn, crops, repeat):
+    latency = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn(crops)
+        latency.append(time.perf_counter() - t0)
+
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    fn(crops)
+    after = tracemalloc.take_snapshot()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    blocks = sum(stat.count_diff for stat in after.compare_to(before, "filename") if stat.count_diff > 0)
+    return {"latency_ms": percentiles(latency), "new_blocks": blocks, "peak_kb": round(peak / 1024, 1)}
+
+
+def parse_args(argv=None):
+    p = argparse.ArgumentParser(description="Stage 3 sınıflandırma yolu benchmark'ı")
+    p.add_argument("--crops", type=int, default=64, help="Resim başına tipik crop sayısı ~30")
+    p.add_argument("--repeat", type=int, default=10)
+    p.add_argument("--batch-size", type=int, default=STAGE3_BATCH_SIZE)
+    p.add_argument("--fit", default="crop", help="crop / letterbox")
+    return p.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    model = load_models("pytorch")["stage3"]
+    if not supports_fast(model):
+        print("❌ Hızlı yol yalnızca PyTorch (.pt) Stage 3 modeliyle çalışır.")
+        sys.exit(1)
+
+    crops = synthetic_crops(args.crops)
+    fast = get_fast_classifier(model, args.batch_size, args.fit)
+    cases = {
+        "per_crop": lambda c: per_crop(model, c),
+        "batched": lambda c: classify_crops(model, c, batch_size=args.batch_size),
+        "fast": fast,
+    }
+
+    # Isınma + sonuç karşılaştırması (cv2 / PIL boyutlama farkından dolayı birebir olmayabilir)
+    reference = cases["batched"](crops)
+    same = sum(a[0] == b[0] for a, b in zip(reference, fast(crops)))
+    print(f"📏 {len(crops)} crop, fast yol ile predict aynı sınıf: {same}/{len(crops)}")
+    cases["per_crop"](crops[:2])
+
+    print(f"{'Yol':<10}{'p50 (ms)':>10}{'p95 (ms)':>10}{'ms/crop':>9}{'yeni blok':>11}{'tepe (KB)':>11}")
+    for name, fn in cases.items():
+        r = measure(fn, crops, args.repeat)
+        lat = r["latency_ms"]
+        print(f"{name:<10}{lat['p50']:>10.1f}{lat['p95']:>10.1f}{lat['p50'] / len(crops):>9.2f}"
+              f"{r['new_blocks']:>11}{r['peak_kb']:>11.1f}")
+
+
+if __name__ == "__main__":
+    main()
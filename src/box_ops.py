@@ -0,0 +1,121 @@
+import numpy as np
+
+# Ortak kutu geometrisi. Tüm fonksiyonlar N x 4 dizilerle çalışır.
+#   xyxy: [x1, y1, x2, y2]
+#   xywh: [x, y, w, h]       (COCO, sol üst köşe + boyut)
+#   yolo: [cx, cy, w, h]     (resim boyutuna bölünmüş, 0-1 arası)
+
+
+def as_boxes(boxes, dtype=None):
+    """Girdiyi N x 4 numpy dizisine çevirir (tek kutu da olabilir)."""
+    return np.asarray(boxes, dtype=dtype).reshape(-1, 4)
+
+
+def xywh_to_xyxy(boxes):
+    b = as_boxes(boxes)
+    return np.stack([b[:, 0], b[:, 1], b[:, 0] + b[:, 2], b[:, 1] + b[:, 3]], axis=1)
+
+
+def xyxy_to_xywh(boxes):
+    b = as_boxes(boxes)
+    return np.stack([b[:, 0], b[:, 1], b[:, 2] - b[:, 0], b[:, 3] - b[:, 1]], axis=1)
+
+
+def xywh_to_yolo(boxes, width, height):
+    """COCO xywh -> normalize YOLO (cx, cy, w, h)."""
+    b = as_boxes(boxes, dtype=float)
+    return np.stack([(b[:, 0] + b[:, 2] / 2) / width,
+                     (b[:, 1] + b[:, 3] / 2) / height,
+                     b[:, 2] / width,
+                     b[:, 3] / height], axis=1)
+
+
+def yolo_to_xyxy(boxes, width, height):
+    """Normalize YOLO (cx, cy, w, h) -> piksel xyxy."""
+    b = as_boxes(boxes, dtype=float)
+    half_w, half_h = b[:, 2] / 2, b[:, 3] / 2
+    return np.stack([(b[:, 0] - half_w) * width, (b[:, 1] - half_h) * height,
+                     (b[:, 0] + half_w) * width, (b[:, 1] + half_h) * height], axis=1)
+
+
+def clip_boxes(boxes, width, height):
+    """xyxy kutuları resim sınırlarına kırpar."""
+    b = as_boxes(boxes)
+    return np.stack([np.clip(b[:, 0], 0, width), np.clip(b[:, 1], 0, height),
+                     np.clip(b[:, 2], 0, width), np.clip(b[:, 3], 0, height)], axis=1)
+
+
+def clip_xywh(boxes, width, height):
+    """xywh kutuları resim sınırlarına kırpar: sol üst köşe >= 0, kutu resmin dışına taşmaz."""
+    b = as_boxes(boxes)
+    x = np.maximum(b[:, 0], 0)
+    y = np.maximum(b[:, 1], 0)
+    return np.stack([x, y, np.minimum(b[:, 2], width - x), np.minimum(b[:, 3], height - y)], axis=1)
+
+
+def areas(boxes):
+    b = as_boxes(boxes)
+    return (b[:, 2] - b[:, 0]) * (b[:, 3] - b[:, 1])
+
+
+def centers(boxes):
+    b = as_boxes(boxes)
+    return (b[:, 0] + b[:, 2]) / 2, (b[:, 1] + b[:, 3]) / 2
+
+
+def intersection_matrix(boxes_a, boxes_b):
+    """N x M kesişim alanı matrisi."""
+    a, b = as_boxes(boxes_a), as_boxes(boxes_b)
+    iw = np.minimum(a[:, None, 2], b[:, 2]) - np.maximum(a[:, None, 0], b[:, 0])
+    ih = np.minimum(a[:, None, 3], b[:, 3]) - np.maximum(a[:, None, 1], b[:, 1])
+    return np.clip(iw, 0, None) * np.clip(ih, 0, None)
+
+
+def iou_matrix(boxes_a, boxes_b):
+    """N x M IoU matrisi."""
+    inter = intersection_matrix(boxes_a, boxes_b).astype(float)
+    union = areas(boxes_a)[:, None] + areas(boxes_b) - inter
+    return np.divide(inter, union, out=np.zeros_like(inter), where=union > 0)
+
+
+def ios_matrix(boxes_a, boxes_b):
+    """N x M kesişim / küçük kutunun alanı (bir kutu diğerinin içindeyse 1)."""
+    inter = intersection_matrix(boxes_a, boxes_b).astype(float)
+    smaller = np.minimum(areas(boxes_a)[:, None], areas(boxes_b))
+    return np.divide(inter, smaller, out=np.zeros_like(inter), where=smaller > 0)
+
+
+def centers_inside(inner_boxes, outer_boxes):
+    """N x M bool matris: inner kutunun merkezi outer kutunun içinde mi (sınır hariç)."""
+    cx, cy = centers(inner_boxes)
+    cx, cy = cx[:, None], cy[:, None]
+    o = as_boxes(outer_boxes)
+    return (o[:, 0] < cx) & (cx < o[:, 2]) & (o[:, 1] < cy) & (cy < o[:, 3])
+
+
+def greedy_suppress(order, overlap, thr):
+    """order sırasıyla gezer; kabul edilmiş bir kutuyla overlap'i thr'yi aşanları atar."""
+    keep = []
+    for i in order:
+        if keep and (overlap[i, keep] > thr).any(): continue
+        keep.append(i)
+    return np.array(keep, dtype=int)
+
+
+def nms(boxes, scores, iou_thr, classes=None, metric="iou", groups=None):
+    """
+    NMS, tutulan indeksleri skor sırasıyla döndürür.
+    classes verilirse yalnızca aynı sınıftaki kutular birbirini bastırır (yoksa sınıftan bağımsız).
+    groups verilirse aynı gruptaki kutular birbirini bastırmaz (ör. aynı karonun, zaten NMS'ten geçmiş kutuları).
+    metric: "iou" ya da "ios" (kesişim / küçük kutu; kesilmiş yarım kutuları da bastırır).
+    """
+    boxes = as_boxes(boxes, dtype=float)
+    order = np.argsort(-np.asarray(scores), kind="stable")
+    overlap = ios_matrix(boxes, boxes) if metric == "ios" else iou_matrix(boxes, boxes)
+    if classes is not None:
+        classes = np.asarray(classes)
+        overlap = np.where(classes[:, None] == classes, overlap, 0)
+    if groups is not None:
+        groups = np.asarray(groups)
+        overlap = np.where(groups[:, None] != groups, overlap, 0)
+    return greedy_suppress(order, overlap, iou_thr)
@@ -5,28 +5,32 @@ import numpy as np
 # Paths
 DATA_DIR = '../data/processed/stage3_classifier/train'
 OUTPUT_FILE = '../data/processed/stage3_classifier/class_weights.json'
+# Ağırlıklar yalnızca BALANCE_MODE="files" eğitiminde kullanılır; o eğitim klasörleri (aug_* dahil) okur,
+# bu yüzden sayım da klasörden yapılır. Paket index'i aug_* içermez, burada kullanılmaz
+# (yoksa stage3_balance'ın dengelediği sınıflar bir kez daha ağırlıklandırılır).
 
-def main():
-    if not os.path.exists(DATA_DIR):
-        print(f"Error: Directory not found -> {DATA_DIR}")
-        return
-
-    # Get class names
+def count_from_folders():
+    class_counts = {}
     classes = sorted([d for d in os.listdir(DATA_DIR) if os.path.isdir(os.path.join(DATA_DIR, d))])
-    
-    class_counts = {} 
-    total_images = 0
-    
     for class_name in classes:
         class_path = os.path.join(DATA_DIR, class_name)
         
         # Count images
         files = [f for f in os.listdir(class_path) if f.endswith(('.png', '.jpg', '.jpeg'))] 
-        count = len(files)
-        
-        class_counts[class_name] = count
-        total_images += count
-        print(f" - {class_name}: {count} images")
+        class_counts[class_name] = len(files)
+    return class_counts
+
+def main():
+    if os.path.exists(DATA_DIR):
+        class_counts = count_from_folders()
+    else:
+        print(f"Error: Directory not found -> {DATA_DIR}")
+        return
+
+    classes = sorted(class_counts)
+    total_images = sum(class_counts.values())
+    for class_name in classes:
+        print(f" - {class_name}: {class_counts[class_name]} images")
 
     # Weight Calculation Formula:
     # Weight = Total Images / (Number of Classes * Images in Class)
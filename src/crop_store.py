@@ -0,0 +1,207 @@
+import os
+import json
+import cv2
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+from tqdm import tqdm
+from dataset_builder import atomic_write_text, WORKERS
+
+# Stage 3 crop'larının paketlenmiş hali (split başına iki dosya):
+#   {split}.bin  : N x IMGSZ x IMGSZ x 3 uint8, ham dizi (np.memmap ile sıfır kopya okunur)
+#   {split}.json : {"imgsz", "fit", "classes", "labels", "sources"}
+#       sources[i] = {"file": crop dosyası, "size", "mtime"}  -> hangi PNG'den geldiği
+ROOT_DIR = "../data/processed/stage3_classifier"
+STORE_DIR = f"{ROOT_DIR}/packed"
+SPLITS = ["train", "val"]
+
+IMGSZ = 224                  # Stage 3 eğitim boyutu (MODEL_IMGSZ["stage3"])
+PAD_COLOR = (114, 114, 114)  # ultralytics letterbox rengi
+
+# Crop'un imgsz x imgsz kareye nasıl sığdırılacağı:
+#   "crop"      -> YOLO.predict / classify_transforms ile aynı: kısa kenar imgsz'ye, ortadan kesim
+#                  (eğitim, val ve varsayılan inference aynı ön işlemeyi görür)
+#   "letterbox" -> oran korunur, kalan PAD_COLOR; yalnızca inference stage3_fit="letterbox" ile kullanılmalı
+FIT = "crop"
+FIT_MODES = ("crop", "letterbox")
+CHUNK_SIZE = 256             # Paketlerken tek seferde decode edilen crop sayısı
+
+
+def letterbox(img, size=IMGSZ, color=PAD_COLOR):
+    """En-boy oranını koruyarak size x size kareye sığdırır, kalan yeri color ile doldurur."""
+    if img.ndim == 2:
+        img = cv2.cvtColor(img, cv2.COLOR_GRAY2BGR)
+    h, w = img.shape[:2]
+    scale = size / max(h, w)
+    nw, nh = max(1, round(w * scale)), max(1, round(h * scale))
+    resized = cv2.resize(img, (nw, nh), interpolation=cv2.INTER_AREA if scale < 1 else cv2.INTER_LINEAR)
+
+    out = np.full((size, size, 3), color, dtype=np.uint8)
+    top, left = (size - nh) // 2, (size - nw) // 2
+    out[top:top + nh, left:left + nw] = resized
+    return out
+
+
+def center_crop(img, size=IMGSZ):
+    """Kısa kenarı size'a ölçekler, ortadan size x size keser (kaynakta ortadaki kare alınıp ölçeklenir)."""
+    if img.ndim == 2:
+        img = cv2.cvtColor(img, cv2.COLOR_GRAY2BGR)
+    h, w = img.shape[:2]
+    side = min(h, w)
+    top, left = int(round((h - side) / 2)), int(round((w - side) / 2))
+    square = img[top:top + side, left:left + side]
+    return cv2.resize(square, (size, size), interpolation=cv2.INTER_AREA if side > size else cv2.INTER_LINEAR)
+
+
+def fit_crop(img, size=IMGSZ, fit=FIT):
+    if fit == "crop":
+        return center_crop(img, size)
+    if fit == "letterbox":
+        return letterbox(img, size)
+    raise ValueError(f"fit şunlardan biri olmalı: {FIT_MODES}")
+
+
+class CropStoreWriter:
+    """
+    Crop'ları sırayla tek bir .bin dosyasına ekler; close() ile dosya ve index yerine taşınır.
+    Yarıda kalırsa eski paket bozulmaz.
+    """
+
+    def __init__(self, prefix, classes, imgsz=IMGSZ, fit=FIT):
+        self.prefix = prefix
+        self.fit = fit
+        self.classes = list(classes)
+        self.class_ids = {name: i for i, name in enumerate(self.classes)}
+        self.imgsz = imgsz
+        self.labels = []
+        self.sources = []
+
+        os.makedirs(os.path.dirname(prefix) or '.', exist_ok=True)
+        self.tmp_path = f"{prefix}.bin.tmp{os.getpid()}"
+        self.f = open(self.tmp_path, 'wb')
+
+    def add(self, crop, label, source, fitted=False):
+        """crop: BGR resim (fitted=True ise zaten imgsz x imgsz x 3), label: sınıf adı, source: provenance sözlüğü."""
+        if not fitted:
+            crop = fit_crop(crop, self.imgsz, self.fit)
+        self.f.write(np.ascontiguousarray(crop, dtype=np.uint8).tobytes())
+        self.labels.append(self.class_ids[label])
+        self.sources.append(source)
+
+    def close(self):
+        self.f.close()
+        os.replace(self.tmp_path, f"{self.prefix}.bin")
+        index = {"imgsz": self.imgsz, "fit": self.fit, "classes": self.classes, "labels": self.labels, "sources": self.sources}
+        atomic_write_text(f"{self.prefix}.json", json.dumps(index))
+
+    def abort(self):
+        self.f.close()
+        if os.path.exists(self.tmp_path): os.remove(self.tmp_path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+
+class CropStore:
+    """
+    Paketlenmiş split'i okur. images[i] memmap üzerinde bir görünüm (kopya yok).
+    Memmap ilk erişimde açılır; DataLoader işçilerine pickle edilirken dizi taşınmaz, her işçi kendisi açar.
+    """
+
+    def __init__(self, prefix):
+        self.prefix = prefix
+        with open(f"{prefix}.json", 'r') as f:
+            index = json.load(f)
+        self.imgsz = index["imgsz"]
+        self.fit = index.get("fit", "letterbox")  # fit alanı olmayan eski paketler letterbox'tı
+        self.classes = index["classes"]
+        self.labels = np.array(index["labels"], dtype=np.int64)
+        self.sources = index["sources"]
+        self._images = None
+
+    @property
+    def images(self):
+        if self._images is None:
+            shape = (len(self.labels), self.imgsz, self.imgsz, 3)
+            if len(self.labels) == 0:
+                self._images = np.empty(shape, dtype=np.uint8)
+            else:
+                self._images = np.memmap(f"{self.prefix}.bin", dtype=np.uint8, mode='r', shape=shape)
+        return self._images
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["_images"] = None
+        return state
+
+    def __len__(self):
+        return len(self.labels)
+
+    def __getitem__(self, i):
+        return self.images[i], int(self.labels[i])
+
+
+def _read_crop(path, imgsz, fit):
+    img = cv2.imread(path)
+    return None if img is None else fit_crop(img, imgsz, fit)
+
+
+def pack_split(split_dir, prefix, imgsz=IMGSZ, workers=WORKERS, fit=FIT):
+    """
+    split_dir/{sınıf}/*.png klasörünü tek pakete çevirir. aug_* dosyaları alınmaz
+    (augmentation eğitimde anlık yapılır). Önceki paketteki değişmemiş crop'lar decode edilmeden kopyalanır.
+    """
+    classes = sorted(d for d in os.listdir(split_dir) if os.path.isdir(os.path.join(split_dir, d)))
+    files = []
+    for cls in classes:
+        class_dir = os.path.join(split_dir, cls)
+        for name in sorted(os.listdir(class_dir)):
+            if name.startswith('aug_') or not name.lower().endswith(('.png', '.jpg', '.jpeg')): continue
+            path = os.path.join(class_dir, name)
+            st = os.stat(path)
+            files.append((cls, {"file": path, "size": st.st_size, "mtime": st.st_mtime_ns}))
+
+    # Önceki paketten tekrar kullanılabilecek satırlar (aynı dosya, aynı boyut/mtime, aynı imgsz ve fit)
+    old, reuse = None, {}
+    if os.path.exists(f"{prefix}.json"):
+        old = CropStore(prefix)
+        if old.imgsz == imgsz and old.fit == fit:
+            reuse = {(s["file"], s["size"], s["mtime"]): i for i, s in enumerate(old.sources)}
+
+    reused = 0
+    with CropStoreWriter(prefix, classes, imgsz, fit) as writer, ThreadPoolExecutor(max_workers=workers) as pool:
+        for start in tqdm(range(0, len(files), CHUNK_SIZE), desc=f"Pack {os.path.basename(split_dir)}"):
+            chunk = files[start:start + CHUNK_SIZE]
+            keys = [(s["file"], s["size"], s["mtime"]) for _, s in chunk]
+            todo = [s["file"] for (_, s), key in zip(chunk, keys) if key not in reuse]
+            decoded = dict(zip(todo, pool.map(_read_crop, todo, [imgsz] * len(todo), [fit] * len(todo))))
+
+            for (cls, source), key in zip(chunk, keys):
+                if key in reuse:
+                    crop = old.images[reuse[key]]
+                    reused += 1
+                else:
+                    crop = decoded[source["file"]]
+                    if crop is None: continue
+                writer.add(crop, cls, source, fitted=True)
+
+    print(f"📦 {prefix}: {len(writer.labels)} crop ({reused} önceki paketten)")
+    return writer.labels
+
+
+def pack_dataset(root_dir=ROOT_DIR, store_dir=STORE_DIR, splits=SPLITS, imgsz=IMGSZ, workers=WORKERS, fit=FIT):
+    for split in splits:
+        split_dir = os.path.join(root_dir, split)
+        if not os.path.isdir(split_dir):
+            print(f"❌ Klasör bulunamadı: {split_dir}")
+            continue
+        pack_split(split_dir, os.path.join(store_dir, split), imgsz, workers, fit)
+
+
+if __name__ == "__main__":
+    pack_dataset()
@@ -0,0 +1,147 @@
+import os
+import json
+import hashlib
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import cv2
+from tqdm import tqdm
+
+# Varsayılan paralel işçi sayısı
+WORKERS = os.cpu_count() or 1
+
+# Manifest bu kadar yeni iş tamamlandıkça diske yazılır (kesintide en fazla bu kadar iş kaybolur)
+SAVE_EVERY = 50
+
+
+def file_hash(path, chunk_size=1 << 20):
+    """Dosya içeriğinin sha1 özeti."""
+    h = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def file_stat(path):
+    """Dosyanın (boyut, mtime_ns) imzası; task özetinde içerik hash'i yerine kullanılır (dosya okunmaz)."""
+    st = os.stat(path)
+    return [st.st_size, st.st_mtime_ns]
+
+
+def task_digest(*parts):
+    """Girdi özeti + annotation + parametrelerden tek bir özet üretir."""
+    h = hashlib.sha1()
+    for part in parts:
+        h.update(json.dumps(part, sort_keys=True, default=str).encode())
+        h.update(b'|')
+    return h.hexdigest()
+
+
+def _tmp_path(path):
+    # Geçici dosya resim uzantısıyla bitmez: yarıda kalırsa *.png taramalarına karışmaz
+    return f"{path}.tmp{os.getpid()}"
+
+
+def atomic_imwrite(path, img):
+    """Resmi önce geçici dosyaya yazar, sonra yerine taşır (yarım dosya kalmaz)."""
+    ok, buf = cv2.imencode(os.path.splitext(path)[1], img)  # format hedef uzantıdan seçilir
+    if not ok:
+        raise IOError(f"Yazılamadı: {path}")
+    tmp = _tmp_path(path)
+    with open(tmp, 'wb') as f:
+        f.write(buf)
+    os.replace(tmp, path)
+
+
+def atomic_write_text(path, text):
+    tmp = _tmp_path(path)
+    with open(tmp, 'w') as f:
+        f.write(text)
+    os.replace(tmp, path)
+
+
+class Manifest:
+    """
+    Tamamlanan işlerin kaydı: {iş_id: {"digest", "outputs", "result"}}.
+    Özet aynıysa ve çıktı dosyaları duruyorsa iş tekrar yapılmaz.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.entries = {}
+        if os.path.exists(path):
+            with open(path, 'r') as f:
+                self.entries = json.load(f)
+
+    def is_done(self, task_id, digest):
+        entry = self.entries.get(task_id)
+        if entry is None or entry["digest"] != digest:
+            return False
+        return all(os.path.exists(p) for p in entry["outputs"])
+
+    def result(self, task_id):
+        return self.entries[task_id]["result"]
+
+    def mark(self, task_id, digest, outputs, result):
+        self.entries[task_id] = {"digest": digest, "outputs": outputs, "result": result}
+
+    def prune(self, scope, keep):
+        """scope önekli olup keep'te olmayan kayıtları çıktılarıyla birlikte siler, silinen kayıt sayısını döndürür."""
+        gone = [k for k in self.entries if k.startswith(scope) and k not in keep]
+        for task_id in gone:
+            for path in self.entries.pop(task_id)["outputs"]:
+                if os.path.exists(path): os.remove(path)
+        if gone:
+            print(f"🧹 {len(gone)} eski iş ve çıktıları silindi.")
+        return len(gone)
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        atomic_write_text(self.path, json.dumps(self.entries))
+
+
+def build(tasks, worker, manifest_path, workers=WORKERS, desc="Building", scope=""):
+    """
+    İşleri süreç havuzunda çalıştırır, manifest ile yarıda kalan işe devam eder.
+
+    tasks: {"id", "digest", ...} sözlükleri; geri kalan alanlar worker'a olduğu gibi gider.
+    worker: modül seviyesinde fonksiyon, task -> {"outputs": [dosya yolları], "result": json-uyumlu değer}
+    scope: bu çağrının sahip olduğu id öneki (ör. "train/"); manifestte bu önekle başlayıp tasks'ta
+           olmayan kayıtların çıktıları silinir ve kayıt düşürülür (resim başka split'e taşındıysa vb.).
+           Aynı manifesti paylaşan çağrılar farklı önek vermeli.
+    Tüm işlerin result değerlerini girdi sırasıyla döndürür (atlananlar manifestten gelir).
+    """
+    manifest = Manifest(manifest_path)
+    if manifest.prune(scope, {t["id"] for t in tasks}):
+        manifest.save()
+    pending = [t for t in tasks if not manifest.is_done(t["id"], t["digest"])]
+    skipped = len(tasks) - len(pending)
+    if skipped:
+        print(f"⏩ {skipped}/{len(tasks)} iş zaten tamam, atlanıyor.")
+
+    failed = set()
+    if pending:
+        done_since_save = 0
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = {pool.submit(worker, t): t for t in pending}
+            for future in tqdm(as_completed(futures), total=len(futures), desc=desc):
+                task = futures[future]
+                try:
+                    out = future.result()
+                except Exception as e:
+                    print(f"❌ {task['id']}: {e}")
+                    failed.add(task["id"])
+                    continue
+
+                # Annotation değiştiyse eski işin artık üretilmeyen çıktılarını temizle
+                old = manifest.entries.get(task["id"], {}).get("outputs", [])
+                for stale in set(old) - set(out["outputs"]):
+                    if os.path.exists(stale): os.remove(stale)
+
+                manifest.mark(task["id"], task["digest"], out["outputs"], out["result"])
+                done_since_save += 1
+                if done_since_save >= SAVE_EVERY:
+                    manifest.save()
+                    done_since_save = 0
+        manifest.save()
+
+    return [None if t["id"] in failed else manifest.result(t["id"]) for t in tasks]
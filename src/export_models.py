@@ -0,0 +1,127 @@
+import os
+import sys
+import cv2
+import numpy as np
+from ultralytics import YOLO
+from main_pipeline import MODEL_PATHS, MODEL_TASKS, MODEL_IMGSZ, load_models, boxes_to_arrays, predict_grouped
+from box_ops import iou_matrix
+
+# Export edilecek formatlar (ultralytics format isimleri = backend isimleri)
+EXPORT_FORMATS = ["onnx", "openvino"]
+
+# Backend karşılaştırması için örnek resimler
+SAMPLE_DIR = "../data/processed/stage1_quadrant/images/val"
+SAMPLE_COUNT = 20
+
+# Doğrulama eşikleri
+MIN_BOX_IOU = 0.95       # Eşleşen kutular arasında en düşük kabul edilen IoU
+MAX_PROB_DIFF = 0.02     # Stage 3 olasılıklarında kabul edilen en büyük fark
+
+
+def export_all(formats=EXPORT_FORMATS):
+    """Üç modeli de seçilen formatlara çevirir. Dosyalar .pt dosyasının yanına yazılır."""
+    for key, path in MODEL_PATHS.items():
+        if not os.path.exists(path):
+            print(f" Hata: Model dosyası eksik -> {path}")
+            continue
+
+        model = YOLO(path, task=MODEL_TASKS[key])
+        for fmt in formats:
+            # dynamic=True: batch boyutu sabit değil (analyze_batch / Stage 3 mikro-batch için)
+            out = model.export(format=fmt, imgsz=MODEL_IMGSZ[key], dynamic=True, half=False)
+            print(f"✅ {key} -> {fmt}: {out}")
+
+
+def _compare_detections(ref, other):
+    """İki detection sonucunu kutu eşleştirerek karşılaştırır."""
+    ref_xyxy, ref_conf, ref_cls = boxes_to_arrays(ref)
+    oth_xyxy, oth_conf, oth_cls = boxes_to_arrays(other)
+    report = {"ref_boxes": len(ref_xyxy), "boxes": len(oth_xyxy), "matched": 0,
+              "min_iou": 1.0, "max_conf_diff": 0.0, "class_mismatch": 0}
+    if len(ref_xyxy) == 0 or len(oth_xyxy) == 0:
+        report["min_iou"] = 1.0 if len(ref_xyxy) == len(oth_xyxy) else 0.0
+        return report
+
+    iou = iou_matrix(ref_xyxy, oth_xyxy)
+    best = iou.argmax(axis=1)
+    best_iou = iou[np.arange(len(ref_xyxy)), best]
+    matched = best_iou >= 0.5
+    report["matched"] = int(matched.sum())
+    report["min_iou"] = float(best_iou[matched].min()) if matched.any() else 0.0
+    report["max_conf_diff"] = float(np.abs(ref_conf[matched] - oth_conf[best[matched]]).max()) if matched.any() else 0.0
+    report["class_mismatch"] = int((ref_cls[matched] != oth_cls[best[matched]]).sum())
+    return report
+
+
+def verify_backends(backends=EXPORT_FORMATS, sample_dir=SAMPLE_DIR, sample_count=SAMPLE_COUNT):
+    """
+    Export edilmiş backend'leri PyTorch ağırlıklarıyla örnek resimler üzerinde karşılaştırır.
+    Stage 3 tüm backend'lerde aynı crop'larla (PyTorch Stage 2 kutuları) beslenir.
+    Backend başına özet rapor döndürür.
+    """
+    files = sorted(f for f in os.listdir(sample_dir) if f.lower().endswith(('.png', '.jpg', '.jpeg')))
+    images = [cv2.imread(os.path.join(sample_dir, f)) for f in files[:sample_count]]
+    images = [img for img in images if img is not None]
+    if not images:
+        print(f"❌ Örnek resim bulunamadı: {sample_dir}")
+        return {}
+
+    ref_models = load_models("pytorch")
+    ref = {key: predict_grouped(ref_models[key], images, verbose=False) for key in ("stage1", "stage2")}
+
+    crops = []
+    for img, t_res in zip(images, ref["stage2"]):
+        for x1, y1, x2, y2 in boxes_to_arrays(t_res)[0].astype(int):
+            crop = img[max(0, y1):y2, max(0, x1):x2]
+            if crop.size > 0: crops.append(crop)
+    ref_probs = np.array([r.probs.data.cpu().numpy() for r in ref_models["stage3"].predict(crops, verbose=False)]) if crops else None
+
+    summary = {}
+    for backend in backends:
+        models = load_models(backend)
+        report = {}
+        for key in ("stage1", "stage2"):
+            results = predict_grouped(models[key], images, verbose=False)
+            parts = [_compare_detections(r, o) for r, o in zip(ref[key], results)]
+            report[key] = {
+                "ref_boxes": sum(p["ref_boxes"] for p in parts),
+                "boxes": sum(p["boxes"] for p in parts),
+                "matched": sum(p["matched"] for p in parts),
+                "min_iou": min(p["min_iou"] for p in parts),
+                "max_conf_diff": max(p["max_conf_diff"] for p in parts),
+                "class_mismatch": sum(p["class_mismatch"] for p in parts),
+            }
+            report[key]["ok"] = (report[key]["matched"] == report[key]["ref_boxes"] == report[key]["boxes"]
+                                 and report[key]["min_iou"] >= MIN_BOX_IOU and report[key]["class_mismatch"] == 0)
+
+        if ref_probs is not None:
+            probs = np.array([r.probs.data.cpu().numpy() for r in models["stage3"].predict(crops, verbose=False)])
+            report["stage3"] = {
+                "crops": len(crops),
+                "top1_agreement": float((probs.argmax(1) == ref_probs.argmax(1)).mean()),
+                "max_prob_diff": float(np.abs(probs - ref_probs).max()),
+            }
+            report["stage3"]["ok"] = report["stage3"]["max_prob_diff"] <= MAX_PROB_DIFF
+
+        summary[backend] = report
+        print(f"\n📊 {backend} vs pytorch ({len(images)} resim):")
+        for key, r in report.items():
+            print(f"   - {key}: {r}")
+
+    return summary
+
+
+def main():
+    command = sys.argv[1] if len(sys.argv) > 1 else "export"
+    formats = sys.argv[2:] or EXPORT_FORMATS
+
+    if command == "export":
+        export_all(formats)
+    elif command == "verify":
+        verify_backends(formats)
+    else:
+        print("Kullanım: python export_models.py [export|verify] [onnx openvino ...]")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,251 @@
+import os
+import json
+import time
+import base64
+import asyncio
+import cv2
+import numpy as np
+from urllib.parse import parse_qs
+from concurrent.futures import ThreadPoolExecutor
+from main_pipeline import load_models, warmup, analyze_batch, visualize_results, resolve_options, STAGE2_MODES
+from result_cache import ResultCache
+from pipeline_hooks import MetricsCollector, SampledProfiler, HookList
+
+# --- SUNUCU AYARLARI ---
+HOST = os.environ.get("TOOTH_HOST", "127.0.0.1")
+PORT = int(os.environ.get("TOOTH_PORT", "8000"))
+
+MAX_BATCH = 8             # Bir micro-batch'teki en fazla resim
+MAX_WAIT_MS = 20          # İlk istekten sonra batch'in dolmasını en fazla bu kadar bekle
+MAX_QUEUE = 64            # Kuyruk doluysa yeni istekler 503 ile reddedilir
+MAX_BODY_BYTES = 50 * 1024 * 1024
+
+# Sonuç cache'i (bellek LRU her zaman açık; disk katmanı için SQLite dosya yolu)
+CACHE_DB = os.environ.get("TOOTH_CACHE_DB")
+
+# GET /metrics (Prometheus) için sayaçlar; 0 ile kapatılır
+METRICS = os.environ.get("TOOTH_METRICS", "1") != "0"
+# Batch'lerin bu oranı cProfile ile profillenir (0: kapalı), çıktılar PROFILE_DIR'e
+PROFILE_RATE = float(os.environ.get("TOOTH_PROFILE_RATE", "0"))
+PROFILE_DIR = os.environ.get("TOOTH_PROFILE_DIR", "../profiles")
+
+
+class QueueFullError(Exception):
+    pass
+
+
+class MicroBatcher:
+    """
+    Eşzamanlı istekleri kuyrukta toplayıp analyze_batch ile tek seferde işler.
+    Batch MAX_BATCH'e ulaşınca ya da ilk istekten MAX_WAIT_MS geçince çalışır.
+    Modeller tek bir inference thread'inden çağrılır.
+    """
+
+    def __init__(self, models, max_batch=MAX_BATCH, max_wait_ms=MAX_WAIT_MS, max_queue=MAX_QUEUE, options=None,
+                 hooks=None):
+        self.models = models
+        self.hooks = hooks
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000
+        self.options = resolve_options(options)
+        self.queue = asyncio.Queue(maxsize=max_queue)
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="inference")
+        self.batches = 0
+        self.images = 0
+
+    async def submit(self, img, options=None):
+        """options: bu istek için çözülmüş ayarlar (None: sunucu varsayılanı)."""
+        future = asyncio.get_running_loop().create_future()
+        try:
+            self.queue.put_nowait((img, options or self.options, future))
+        except asyncio.QueueFull:
+            raise QueueFullError()
+        return await future
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self.queue.get()]
+            deadline = loop.time() + self.max_wait
+            while len(batch) < self.max_batch:
+                timeout = deadline - loop.time()
+                if timeout <= 0: break
+                try:
+                    batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+
+            # Farklı ayarlı istekler (ör. global / tiled) ayrı analyze_batch çağrılarında işlenir
+            groups = {}
+            for item in batch:
+                groups.setdefault(json.dumps(item[1], sort_keys=True), []).append(item)
+
+            for group in groups.values():
+                images, options = [img for img, _, _ in group], group[0][1]
+                try:
+                    results = await loop.run_in_executor(
+                        self.executor, lambda: analyze_batch(images, self.models, options=options, hooks=self.hooks))
+                except Exception as e:
+                    for _, _, future in group:
+                        if not future.done(): future.set_exception(e)
+                    continue
+
+                self.batches += 1
+                self.images += len(group)
+                for (_, _, future), pathologies in zip(group, results):
+                    if not future.done(): future.set_result(pathologies)
+
+
+class InferenceApp:
+    """
+    Bağımlılıksız ASGI uygulaması.
+      GET  /health                 -> durum ve kuyruk bilgisi
+      GET  /metrics                -> Prometheus text formatında sayaçlar / histogramlar
+      POST /analyze[?overlay=1][&stage2_mode=global|tiled|quadrant]
+                                   -> gövde: ham resim dosyası (PNG/JPG), cevap: bulgu JSON'u
+    """
+
+    def __init__(self, options=None, cache=None, metrics=None, profiler=None):
+        self.options = options
+        self.cache = cache
+        self.metrics = metrics
+        self.profiler = profiler
+        self.models = None
+        self.batcher = None
+        self.started_at = None
+
+    async def startup(self):
+        self.models = load_models()
+        warmup(self.models)
+        if self.cache is not None:
+            self.cache.bind(self.models)  # anahtarlar yüklenen ağırlıklara göre (dosya sonradan değişse de)
+        hooks = [h for h in (self.metrics, self.profiler) if h is not None]
+        self.batcher = MicroBatcher(self.models, options=self.options,
+                                    hooks=HookList(hooks) if len(hooks) > 1 else (hooks[0] if hooks else None))
+        asyncio.get_running_loop().create_task(self.batcher.run())
+        self.started_at = time.time()
+        print(f"✅ Modeller yüklendi, sunucu hazır: http://{HOST}:{PORT}")
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            return await self._lifespan(receive, send)
+        if scope["type"] != "http":
+            return
+
+        path, method = scope["path"], scope["method"]
+        if path == "/health" and method == "GET":
+            return await self._health(send)
+        if path == "/metrics" and method == "GET":
+            return await self._metrics(send)
+        if path == "/analyze" and method == "POST":
+            return await self._analyze(scope, receive, send)
+        return await _send_json(send, 404, {"error": "Bulunamadı"})
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                try:
+                    await self.startup()
+                except BaseException as e:
+                    await send({"type": "lifespan.startup.failed", "message": str(e)})
+                    return
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    async def _health(self, send):
+        ready = self.batcher is not None
+        body = {
+            "status": "ok" if ready else "starting",
+            "models": sorted(self.models) if self.models else [],
+            "queue_depth": self.batcher.queue.qsize() if ready else 0,
+            "batches": self.batcher.batches if ready else 0,
+            "images": self.batcher.images if ready else 0,
+            "uptime_s": round(time.time() - self.started_at, 1) if ready else 0,
+        }
+        if self.cache is not None:
+            body["cache"] = self.cache.stats()
+        if ready and hasattr(self.models, "timings"):
+            body["startup"] = self.models.timings()
+        await _send_json(send, 200 if ready else 503, body)
+
+    async def _metrics(self, send):
+        if self.metrics is None:
+            return await _send_json(send, 404, {"error": "Metrikler kapalı"})
+        body = self.metrics.render().encode("utf-8")
+        await send({"type": "http.response.start", "status": 200,
+                    "headers": [(b"content-type", b"text/plain; version=0.0.4; charset=utf-8"),
+                                (b"content-length", str(len(body)).encode())]})
+        await send({"type": "http.response.body", "body": body})
+
+    async def _analyze(self, scope, receive, send):
+        if self.batcher is None:
+            return await _send_json(send, 503, {"error": "Modeller henüz yüklenmedi"})
+
+        body = await _read_body(receive)
+        if body is None:
+            return await _send_json(send, 413, {"error": "Dosya çok büyük"})
+
+        img = cv2.imdecode(np.frombuffer(body, dtype=np.uint8), cv2.IMREAD_COLOR)
+        if img is None:
+            return await _send_json(send, 400, {"error": "Resim okunamadı"})
+
+        query = parse_qs(scope.get("query_string", b"").decode())
+        options = dict(self.batcher.options)
+        if "stage2_mode" in query:
+            if query["stage2_mode"][0] not in STAGE2_MODES:
+                return await _send_json(send, 400, {"error": f"stage2_mode şunlardan biri olmalı: {STAGE2_MODES}"})
+            options["stage2_mode"] = query["stage2_mode"][0]
+
+        key = self.cache.make_key(body, options) if self.cache is not None else None
+        pathologies = self.cache.get(key) if key else None
+
+        if pathologies is None:
+            try:
+                pathologies = await self.batcher.submit(img, options)
+            except QueueFullError:
+                return await _send_json(send, 503, {"error": "Sunucu meşgul, tekrar deneyin"})
+            except Exception as e:
+                return await _send_json(send, 500, {"error": str(e)})
+            if key:
+                self.cache.put(key, pathologies)
+
+        result = {"pathologies": pathologies}
+        if query.get("overlay", ["0"])[0] in ("1", "true"):
+            ok, png = cv2.imencode(".png", visualize_results(img, pathologies))
+            if ok:
+                result["overlay_png"] = base64.b64encode(png.tobytes()).decode("ascii")
+        await _send_json(send, 200, result)
+
+
+async def _read_body(receive):
+    chunks, size = [], 0
+    while True:
+        message = await receive()
+        chunk = message.get("body", b"")
+        size += len(chunk)
+        if size > MAX_BODY_BYTES:
+            return None
+        chunks.append(chunk)
+        if not message.get("more_body", False):
+            return b"".join(chunks)
+
+
+async def _send_json(send, status, payload):
+    body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+    await send({"type": "http.response.start", "status": status,
+                "headers": [(b"content-type", b"application/json"),
+                            (b"content-length", str(len(body)).encode())]})
+    await send({"type": "http.response.body", "body": body})
+
+
+app = InferenceApp(cache=ResultCache(db_path=CACHE_DB),
+                   metrics=MetricsCollector() if METRICS else None,
+                   profiler=SampledProfiler(PROFILE_DIR, PROFILE_RATE) if PROFILE_RATE > 0 else None)
+
+
+if __name__ == "__main__":
+    import uvicorn
+    uvicorn.run(app, host=HOST, port=PORT, workers=1)
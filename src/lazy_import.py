@@ -0,0 +1,49 @@
+import sys
+import time
+import types
+import importlib
+import threading
+
+# Ağır kütüphaneleri (cv2, torch, ultralytics) ilk kullanıldıkları ana kadar yüklemeyen modül vekili.
+#   cv2 = lazy_module("cv2")   -> import anında hiçbir şey yüklenmez, ilk cv2.xxx erişiminde yüklenir
+# Her modülün gerçek import süresi IMPORT_TIMES'a (saniye) yazılır; soğuk başlangıç raporları için.
+
+IMPORT_TIMES = {}
+_lock = threading.Lock()
+
+
+class LazyModule(types.ModuleType):
+    """İlk öznitelik erişiminde asıl modülü import eden vekil."""
+
+    def __init__(self, name):
+        super().__init__(name)
+        self.__dict__["_module"] = None
+
+    def _load(self):
+        module = self.__dict__["_module"]
+        if module is None:
+            with _lock:
+                module = self.__dict__["_module"]
+                if module is None:
+                    already = self.__name__ in sys.modules
+                    t0 = time.perf_counter()
+                    module = importlib.import_module(self.__name__)
+                    if not already:
+                        IMPORT_TIMES[self.__name__] = time.perf_counter() - t0
+                    self.__dict__["_module"] = module
+        return module
+
+    def __getattr__(self, attr):
+        return getattr(self._load(), attr)
+
+    def __dir__(self):
+        return dir(self._load())
+
+    def __repr__(self):
+        state = "yüklendi" if self.__dict__["_module"] is not None else "yüklenmedi"
+        return f"<lazy module '{self.__name__}' ({state})>"
+
+
+def lazy_module(name):
+    """name zaten import edilmişse modülün kendisi, değilse LazyModule vekili."""
+    return sys.modules.get(name) or LazyModule(name)
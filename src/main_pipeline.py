@@ -1,8 +1,18 @@
-import cv2
 import os
 import sys
 import time
-from ultralytics import YOLO
+import hashlib
+import threading
+from collections.abc import Mapping
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import box_ops
+from lazy_import import lazy_module, IMPORT_TIMES
+from preprocess import apply_clahe, apply_clahe_batch, PAD_RATIO
+
+# cv2 / ultralytics (ve onunla torch) ilk kullanımda yüklenir; import main_pipeline hızlı kalır
+cv2 = lazy_module("cv2")
+ultralytics = lazy_module("ultralytics")
 
 # --- YAPILANDIRMA (CONFIG) ---
 MODEL_PATHS = {
@@ -11,6 +21,61 @@ MODEL_PATHS = {
     "stage3": "../models/stage3_m_224_cls/weights/best.pt"
 }
 
+# Çıkarım backend'i: pytorch / onnx / openvino / openvino_int8
+# (ONNX ve OpenVINO dosyaları export_models.py, INT8 modeller quantize_models.py ile üretilir)
+BACKEND = os.environ.get("TOOTH_BACKEND", "pytorch")
+BACKEND_SUFFIXES = {
+    "pytorch": ".pt",
+    "onnx": ".onnx",
+    "openvino": "_openvino_model",
+    "openvino_int8": "_int8_openvino_model",
+}
+MODEL_TASKS = {"stage1": "detect", "stage2": "detect", "stage3": "classify"}
+MODEL_IMGSZ = {"stage1": 640, "stage2": 640, "stage3": 224}
+
+# Stage 3 tek seferde kaç crop sınıflandırsın (CPU'da 32 iyi bir denge)
+STAGE3_BATCH_SIZE = 32
+
+# analyze_image / analyze_images için varsayılan çalışma ayarları
+PIPELINE_OPTIONS = {
+    "stage1_conf": 0.5,
+    "stage2_conf": 0.05,
+    "parallel_detect": False,   # Stage 1 ve Stage 2'yi aynı anda çalıştır
+    "detect_threads": None,     # Paralel modda detector başına torch thread sayısı (None: çekirdek / 2)
+    "assign_policy": "first",   # Merkezi birden çok quadrant'a düşen diş için: first / overlap / nearest
+
+    # Stage 2 çalışma şekli:
+    #   "global"   -> tüm resim tek geçiş (hızlı)
+    #   "tiled"    -> örtüşen karolar (küçük bulgular için)
+    #   "quadrant" -> Stage 1 quadrant'ları eğitimdeki gibi %10 pay + CLAHE ile kesilip batch halinde işlenir
+    # Stage 1 her zaman global çalışır (quadrant'lar büyük nesneler)
+    "stage2_mode": "global",
+    "tile_size": 640,           # Karo kenarı (piksel); model girişiyle aynıysa karolar küçültülmeden işlenir
+    "tile_overlap": 0.25,       # Komşu karolar arası örtüşme oranı
+    "tile_batch": 16,           # Tek predict çağrısındaki karo sayısı
+    "tile_merge_ios": 0.6,      # Karo sınırlarındaki tekrarları birleştiren NMS eşiği (kesişim / küçük kutu)
+
+    # Stage 3 öncesi aday eleme (None / 0 = kapalı)
+    "nms_iou": None,            # Sınıftan bağımsız NMS IoU eşiği
+    "dedupe_ios": None,         # Kabul edilmiş bir dişle kesişim / küçük kutu alanı bu değeri aşarsa at
+    "min_crop_area": 0,         # Piksel cinsinden en küçük crop alanı
+    "max_aspect": None,         # Uzun kenar / kısa kenar üst sınırı (ince şerit kutular)
+    "max_per_quadrant": None,   # Quadrant başına en yüksek güvenli N diş
+
+    # Stage 3 crop'larına eğitimdeki (stage3_prepare) CLAHE'yi uygula
+    "stage3_clahe": False,
+
+    # Stage 3'ü predict yerine önceden ayrılmış batch tamponu + doğrudan forward ile çalıştır (stage3_fast.py)
+    # Yalnızca PyTorch backend'de; diğerlerinde predict'e düşer
+    "stage3_fast": False,
+    "stage3_fit": "crop",       # crop: predict ve varsayılan paketle aynı (kısa kenar + orta kesim) / letterbox: FIT="letterbox" paketle eğitilmiş model
+}
+
+
+STAGE2_MODES = ("global", "tiled", "quadrant")
+
+# Yalnızca nasıl çalışıldığını belirleyen, sonucu değiştirmeyen ayarlar (ör. result_cache anahtarına girmez)
+EXECUTION_OPTIONS = ("parallel_detect", "detect_threads", "tile_batch")
 
 COLORS = {
     "Caries": (0, 165, 255),        # orange
@@ -19,85 +84,552 @@ COLORS = {
     "Periapical_Lesion": (0, 255, 255) # yellow
 }
 
-def load_models():
-    models = {}
+def model_path(key, backend=None):
+    """Seçilen backend için model dosyasının (veya OpenVINO klasörünün) yolu."""
+    backend = backend or BACKEND
+    if backend not in BACKEND_SUFFIXES:
+        raise ValueError(f"Bilinmeyen backend: {backend}")
+    return os.path.splitext(MODEL_PATHS[key])[0] + BACKEND_SUFFIXES[backend]
+
+def weights_signature(path):
+    """Model dosyasının (OpenVINO'da klasördeki tüm dosyaların) yol|boyut|değişiklik zamanı özeti."""
+    files = [path]
+    if os.path.isdir(path):  # OpenVINO: klasör
+        files = sorted(os.path.join(root, f) for root, _, names in os.walk(path) for f in names)
+    parts = []
+    for f in files:
+        try:
+            st = os.stat(f)
+            parts.append(f"{f}|{st.st_size}|{st.st_mtime_ns}")
+        except OSError:
+            parts.append(f"{f}|missing")
+    return ";".join(parts)
+
+class ModelRegistry(Mapping):
+    """
+    models["stage1"] gibi sözlük erişimi; her model ilk erişildiğinde yüklenir (thread-safe).
+    Yalnızca Stage 1'i kullanan bir çalıştırma diğer iki checkpoint'i hiç yüklemez.
+    Yükleme ve ısınma süreleri load_times / warmup_times'ta (saniye), timings() ile raporlanır.
+    Her modelin dosya imzası yüklendiği anda alınır; fingerprint() bellekteki ağırlıkları tanımlar
+    (sunucu çalışırken dosya değişse de değişmez).
+    """
+
+    def __init__(self, backend=None, keys=None):
+        self.backend = backend
+        self.paths = {key: model_path(key, backend) for key in (keys or MODEL_PATHS)}
+        self.load_times = {}
+        self.warmup_times = {}
+        self.signatures = {}
+        self._models = {}
+        self._lock = threading.Lock()
+
+    def __getitem__(self, key):
+        model = self._models.get(key)
+        if model is None:
+            if key not in self.paths: raise KeyError(key)
+            with self._lock:
+                if key not in self._models:
+                    t0 = time.perf_counter()
+                    self.signatures[key] = weights_signature(self.paths[key])
+                    self._models[key] = ultralytics.YOLO(self.paths[key], task=MODEL_TASKS[key])
+                    self.load_times[key] = time.perf_counter() - t0
+                model = self._models[key]
+        return model
+
+    def __iter__(self):
+        return iter(self.paths)
+
+    def __len__(self):
+        return len(self.paths)
+
+    def loaded(self):
+        return list(self._models)
+
+    def load_all(self):
+        for key in self.paths:
+            self[key]
+        return self
+
+    def warmup(self, runs=1, keys=None):
+        return warmup(self, runs, keys)
+
+    def fingerprint(self):
+        """Yüklenmiş ağırlıkların özeti (eksik modeller önce yüklenir); result_cache anahtarında kullanılır."""
+        self.load_all()
+        h = hashlib.sha1(str(self.backend or BACKEND).encode())
+        for key in sorted(self.signatures):
+            h.update(f"{key}={self.signatures[key]}".encode())
+        return h.hexdigest()
+
+    def timings(self):
+        """Soğuk başlangıç raporu: kütüphane import, model yükleme ve ısınma süreleri (ms)."""
+        ms = lambda d: {k: round(v * 1000, 1) for k, v in d.items()}
+        return {"imports_ms": ms(IMPORT_TIMES), "load_ms": ms(self.load_times), "warmup_ms": ms(self.warmup_times)}
+
+def load_models(backend=None, lazy=True, keys=None):
+    """
+    Model kayıt defteri döndürür. Dosyaların varlığı hemen kontrol edilir,
+    modeller ilk kullanımda yüklenir (lazy=False ise hepsi şimdi).
+    lazy=True iken bozuk / uyumsuz checkpoint burada yakalanmaz, ilk kullanımda (ilk istekte) hata verir.
+    Hatanın başlangıçta çıkması gereken yerlerde lazy=False ya da warmup() kullanın (ikisi de her modeli yükler).
+    """
     try:
-        for key, path in MODEL_PATHS.items():
-            if os.path.exists(path):
-                models[key] = YOLO(path)
-            else:
+        models = ModelRegistry(backend, keys)
+        for path in models.paths.values():
+            if not os.path.exists(path):
                 print(f" Hata: Model dosyası eksik -> {path}")
                 sys.exit(1)
+        if not lazy:
+            models.load_all()
     except Exception as e:
         print(f"Beklenmeyen Hata: {e}")
         sys.exit(1)
         
     return models
 
+def warmup(models, runs=1, keys=None):
+    """
+    İlk isteğin yavaş olmaması için modelleri boş girdilerle birkaç kez çalıştırır.
+    keys verilirse yalnızca onlar (ModelRegistry'de henüz yüklenmemişse bu sırada yüklenir).
+    """
+    for key in keys or list(models):
+        model = models[key]
+        size = MODEL_IMGSZ[key]
+        dummy = np.zeros((size, size, 3), dtype=np.uint8)
+        t0 = time.perf_counter()
+        for _ in range(runs):
+            model.predict([dummy], verbose=False)
+        if isinstance(models, ModelRegistry):
+            models.warmup_times[key] = time.perf_counter() - t0
+
 def check_containment(inner_box, outer_box):
     """Dişin merkezi, Quadrant kutusunun içinde mi?"""
-    ix_center = (inner_box[0] + inner_box[2]) / 2
-    iy_center = (inner_box[1] + inner_box[3]) / 2
-    ox1, oy1, ox2, oy2 = outer_box
-    return (ox1 < ix_center < ox2) and (oy1 < iy_center < oy2)
+    return bool(box_ops.centers_inside(inner_box, outer_box)[0, 0])
+
+def resolve_options(options=None):
+    """Verilen ayarları varsayılanların üzerine yazar, bilinmeyen anahtarda hata verir."""
+    merged = dict(PIPELINE_OPTIONS)
+    if options:
+        unknown = set(options) - set(PIPELINE_OPTIONS)
+        if unknown:
+            raise ValueError(f"Bilinmeyen pipeline ayarı: {sorted(unknown)}")
+        merged.update(options)
+    return merged
 
-def analyze_image(image_path, models):
+# Paralel mod için her (detector, thread sayısı) çiftinin kendi tek thread'lik havuzu var.
+# Farklı thread sayılı havuzlar da aynı modeli kullanır; detector başına kilit aynı modelin
+# hiçbir zaman iki thread'den aynı anda çağrılmamasını sağlar.
+_DETECT_POOLS = {}
+_DETECT_LOCKS = {"stage1": threading.Lock(), "stage2": threading.Lock()}
+_DETECT_POOLS_LOCK = threading.Lock()
+
+def _get_torch_threads():
+    import torch
+    return torch.get_num_threads()
+
+def _set_torch_threads(n):
+    import torch
+    torch.set_num_threads(n)
+
+def _run_detector(stage, n_threads, fn, *args, **kwargs):
+    # torch.set_num_threads süreç geneli: her işte yeniden ayarlanır (çağıran run_detectors sonra eski değere döner)
+    with _DETECT_LOCKS[stage]:
+        _set_torch_threads(n_threads)
+        return _timed_call(fn, *args, **kwargs)
+
+def _submit_detect(stage, n_threads, fn, *args, **kwargs):
+    """İşi (stage, n_threads) havuzuna gönderir; kapanmış / bozulmuş havuz atılıp yenisi kurulur."""
+    n_threads = n_threads or max(1, (os.cpu_count() or 2) // 2)
+    key = (stage, n_threads)
+    for attempt in range(2):
+        with _DETECT_POOLS_LOCK:
+            if key not in _DETECT_POOLS:
+                _DETECT_POOLS[key] = ThreadPoolExecutor(max_workers=1, thread_name_prefix=f"{stage}-t{n_threads}")
+            pool = _DETECT_POOLS[key]
+        try:
+            return pool.submit(_run_detector, stage, n_threads, fn, *args, **kwargs)
+        except RuntimeError:  # BrokenThreadPool ya da shutdown edilmiş havuz
+            with _DETECT_POOLS_LOCK:
+                if _DETECT_POOLS.get(key) is pool: del _DETECT_POOLS[key]
+            if attempt: raise
+
+def predict_grouped(model, images, **kwargs):
     """
-    CORE FUNCTION: Resmi analiz eder ve saf veri döndürür.
-    Çizim yapmaz, sadece hesaplar. API bu fonksiyonu kullanacak.
+    Resimleri boyutlarına göre gruplar, her grubu tek batch'te çalıştırır; sonuçlar girdi sırasıyla döner.
+    Farklı boyutlu resimler aynı batch'e girince letterbox kare dolguya geçer ve kutular
+    tek resimlik çalıştırmadan biraz sapar; aynı boyutlu gruplarda sonuç birebir aynıdır.
     """
-    img = cv2.imread(image_path)
-    if img is None: return None, []
+    groups = {}
+    for i, img in enumerate(images):
+        groups.setdefault(img.shape, []).append(i)
+
+    results = [None] * len(images)
+    for idx in groups.values():
+        for i, res in zip(idx, model.predict([images[i] for i in idx], **kwargs)):
+            results[i] = res
+    return results
+
+class Detections:
+    """
+    Birleştirilmiş tespitler (ör. karolardan). collect_candidates / boxes_to_arrays için
+    ultralytics sonucu yerine geçer: names ve len(boxes) aynı şekilde kullanılır.
+    """
+
+    def __init__(self, xyxy, conf, cls, names, quadrants=None):
+        self.xyxy = xyxy
+        self.conf = conf
+        self.cls = cls
+        self.names = names
+        self.quadrants = quadrants  # Kutunun ait olduğu Stage 1 kutusunun indeksi (biliniyorsa)
+
+    @property
+    def boxes(self):
+        return self
+
+    def __len__(self):
+        return len(self.xyxy)
 
+def tile_origins(length, tile, overlap):
+    """Bir eksen boyunca karo başlangıçları; son karo kenara hizalanır, böylece tüm karolar aynı boyda olur."""
+    if length <= tile:
+        return [0]
+    stride = max(1, int(tile * (1 - overlap)))
+    return list(range(0, length - tile, stride)) + [length - tile]
+
+def predict_tiled(model, images, options, **kwargs):
+    """
+    Her resmi örtüşen karolara böler, tüm resimlerin karolarını ortak batch'lerde çalıştırır,
+    kutuları resim koordinatına taşıyıp karo sınırlarındaki tekrarları NMS ile birleştirir
+    (yalnızca farklı karoların kutuları birbirini bastırır; karo içi modelin kendi NMS'inde kalır).
+    Resim başına bir Detections döndürür.
+    """
+    tile, overlap, batch = options["tile_size"], options["tile_overlap"], options["tile_batch"]
+    tiles, owners = [], []
+    for i, img in enumerate(images):
+        h, w = img.shape[:2]
+        for y0 in tile_origins(h, tile, overlap):
+            for x0 in tile_origins(w, tile, overlap):
+                tiles.append(img[y0:y0 + tile, x0:x0 + tile])
+                owners.append((i, x0, y0))
+
+    parts = [[] for _ in images]
+    for start in range(0, len(tiles), batch):
+        results = predict_grouped(model, tiles[start:start + batch], **kwargs)
+        for (i, x0, y0), res in zip(owners[start:start + batch], results):
+            xyxy, conf, cls = boxes_to_arrays(res)
+            tile_id = np.full(len(conf), len(parts[i]))
+            parts[i].append((xyxy + np.array([x0, y0, x0, y0], dtype=xyxy.dtype), conf, cls, tile_id))
+
+    merged = []
+    for part in parts:
+        xyxy = np.concatenate([p[0] for p in part]).reshape(-1, 4)
+        conf = np.concatenate([p[1] for p in part])
+        cls = np.concatenate([p[2] for p in part]).astype(int)
+        tile_ids = np.concatenate([p[3] for p in part])
+        # Sınıftan bağımsız: sınırda kesilen diş iki karoda farklı türle etiketlenebilir (yarım premolar ->
+        # canine); en güvenli kutu (ve sınıfı) kalır, diş iki kez sınıflanmaz.
+        # Aynı karonun kutuları birbirini bastırmaz: bitişik dişlerin IoS'u eşiği geçse de model ikisini tuttuysa kalır
+        keep = box_ops.nms(xyxy, conf, options["tile_merge_ios"], metric="ios", groups=tile_ids)
+        merged.append(Detections(xyxy[keep], conf[keep], cls[keep], model.names))
+    return merged
+
+def quadrant_crops(img, q_xyxy, pad_ratio=PAD_RATIO):
+    """
+    Quadrant'ları stage2_prepare ile aynı şekilde keser: genişliğin pad_ratio'su kadar pay + CLAHE.
+    (crop, (qx, qy)) listesi döndürür; qx, qy crop'un resimdeki sol üst köşesi.
+    """
     h_img, w_img = img.shape[:2]
-    detected_pathologies = [] 
+    crops = []
+    for x1, y1, x2, y2 in q_xyxy.tolist():
+        pad = int((x2 - x1) * pad_ratio)
+        qx, qy = max(0, int(x1 - pad)), max(0, int(y1 - pad))
+        end_x, end_y = min(w_img, int(x2 + pad)), min(h_img, int(y2 + pad))
+        crop = img[qy:end_y, qx:end_x]
+        crops.append((apply_clahe(crop) if crop.size else None, (qx, qy)))
+    return crops
 
-    # --- Stage 1: Quadrant  ---
-    q_results = models["stage1"].predict(img, conf=0.5, verbose=False)
-    q_boxes = q_results[0].boxes
-    
-    if len(q_boxes) == 0:
-        print("⚠️ Uyarı: Quadrant bulunamadı.")
-        return img, []
-
-    quadrants = []
-    for box in q_boxes:
-        coords = box.xyxy[0].cpu().numpy()
-        label = q_results[0].names[int(box.cls[0])].replace("quadrant_", "Q").replace("Quadrant ", "Q")
-        quadrants.append((label, coords))
-
-    # --- Stage 2: Diş Tespiti ---
-    t_results = models["stage2"].predict(img, conf=0.05, verbose=False)
-    teeth_boxes = t_results[0].boxes
-
-    # --- Stage 3: Analiz Döngüsü ---
-    for box in teeth_boxes:
-        tx1, ty1, tx2, ty2 = map(int, box.xyxy[0].cpu().numpy())
-        tooth_box = [tx1, ty1, tx2, ty2]
-        
-        # 3.1: Hiyerarşi Kontrolü
-        assigned_q = None
-        for q_lbl, q_coords in quadrants:
-            if check_containment(tooth_box, q_coords):
-                assigned_q = q_lbl
-                break
-        
-        if assigned_q is None: continue 
+def predict_quadrants(model, images, q_results, policy="first", **kwargs):
+    """
+    Stage 2'yi her resmin quadrant crop'ları üzerinde çalıştırır (tüm crop'lar tek predict çağrısında).
+    Kutular resim koordinatına taşınır ve global moddaki gibi assign_quadrants(policy) ile sahibi bulunur;
+    yalnızca sahibi crop'un kendi quadrant'ı olan kutular tutulur. Böylece pay bölgesindeki komşu dişler
+    ve örtüşen quadrant'larda (orta hat, oklüzal düzlem) iki kez görülen dişler bir kez sayılır.
+    Resim başına bir Detections döndürür.
+    """
+    jobs = []
+    for i, (img, q_res) in enumerate(zip(images, q_results)):
+        q_xyxy = boxes_to_arrays(q_res)[0]
+        for q, (crop, offset) in enumerate(quadrant_crops(img, q_xyxy)):
+            if crop is not None:
+                jobs.append((i, q, q_xyxy, offset, crop))
+
+    # Farklı boyutlu crop'lar tek batch'te kare letterbox'a gider (eğitimdeki imgsz x imgsz girişle aynı)
+    results = model.predict([job[4] for job in jobs], **kwargs) if jobs else []
+
+    # Kutusu olmayan resimler için boş satır: (xyxy, conf, cls, quadrant)
+    empty = (np.zeros((0, 4)), np.zeros(0), np.zeros(0, dtype=int), np.zeros(0, dtype=int))
+    parts = [[empty] for _ in images]
+    for (i, q, q_xyxy, (qx, qy), _), res in zip(jobs, results):
+        xyxy, conf, cls = boxes_to_arrays(res)
+        xyxy = xyxy + np.array([qx, qy, qx, qy], dtype=xyxy.dtype)
+        own = assign_quadrants(xyxy, q_xyxy, policy) == q
+        parts[i].append((xyxy[own], conf[own], cls[own], np.full(int(own.sum()), q, dtype=int)))
+
+    merged = []
+    for part in parts:
+        xyxy, conf, cls, quadrants = (np.concatenate(col) for col in zip(*part))
+        merged.append(Detections(xyxy, conf, cls.astype(int), model.names, quadrants))
+    return merged
 
-        # 3.2: Diş Türü
-        tooth_type = t_results[0].names[int(box.cls[0])]
+def predict_stage2(model, images, options, q_results=None, **kwargs):
+    """stage2_mode ayarına göre Stage 2'yi global, karolu ya da quadrant crop'ları üzerinde çalıştırır."""
+    mode = options["stage2_mode"]
+    if mode == "global":
+        return predict_grouped(model, images, **kwargs)
+    if mode == "tiled":
+        return predict_tiled(model, images, options, **kwargs)
+    if mode == "quadrant":
+        return predict_quadrants(model, images, q_results, options["assign_policy"], **kwargs)
+    raise ValueError(f"Bilinmeyen stage2_mode: {mode}")
 
-        # 3.3: Hastalık Kontrolü
+def _timed_call(fn, *args, **kwargs):
+    t0 = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return result, time.perf_counter() - t0
+
+def run_detectors(images, models, options=None, stats=None):
+    """
+    Stage 1 (quadrant) ve Stage 2 (diş) tespitini resim listesi üzerinde çalıştırır.
+    (q_results, t_results) döndürür; quadrant bulunamayan resimlerin Stage 2 sonucu None olur.
+    parallel_detect açıksa iki detector aynı anda çalışır (quadrant modunda Stage 2 Stage 1'i bekler).
+    stats verilirse stage1 / stage2 süreleri stats["timings"]'e eklenir (paralel modda örtüşürler).
+    """
+    options = resolve_options(options)
+    q_kwargs = dict(conf=options["stage1_conf"], verbose=False)
+    t_kwargs = dict(conf=options["stage2_conf"], verbose=False)
+
+    # Quadrant modunda Stage 2, Stage 1 çıktısına bağlı: paralel çalışamaz
+    if options["parallel_detect"] and options["stage2_mode"] != "quadrant":
+        n_threads = options["detect_threads"]
+        prev_threads = _get_torch_threads()
+        try:
+            q_future = _submit_detect("stage1", n_threads, predict_grouped, models["stage1"], images, **q_kwargs)
+            t_future = _submit_detect("stage2", n_threads, predict_stage2, models["stage2"], images, options,
+                                      **t_kwargs)
+            q_results, seconds = q_future.result()
+            add_timing(stats, "stage1", seconds)
+            active = [i for i, res in enumerate(q_results) if len(res.boxes) > 0]
+
+            # Quadrant yoksa Stage 2 sonucunu beklemeden çık: başlamadıysa iptal edilir, çalışıyorsa arka planda
+            # biter. Thread ayarı yine hemen geri alınır; süren Stage 2 kalan işlemlerini o ayarla yapabilir
+            # (yalnızca hız etkilenir), sonraki detector işleri ayarı _run_detector'da yeniden yapar.
+            if not active:
+                t_future.cancel()
+                return q_results, [None] * len(images)
+            t_all, seconds = t_future.result()
+        finally:
+            # Stage 3 ve sonraki çağrılar detector thread ayarından etkilenmesin
+            _set_torch_threads(prev_threads)
+        add_timing(stats, "stage2", seconds)
+        t_results = [t_all[i] if i in active else None for i in range(len(images))]
+        return q_results, t_results
+
+    q_results, seconds = _timed_call(predict_grouped, models["stage1"], images, **q_kwargs)
+    add_timing(stats, "stage1", seconds)
+    active = [i for i, res in enumerate(q_results) if len(res.boxes) > 0]
+    t_results = [None] * len(images)
+    if active:
+        t_active, seconds = _timed_call(predict_stage2, models["stage2"], [images[i] for i in active], options,
+                                        [q_results[i] for i in active], **t_kwargs)
+        add_timing(stats, "stage2", seconds)
+        for i, t_res in zip(active, t_active):
+            t_results[i] = t_res
+    return q_results, t_results
+
+def classify_crops(model, crops, batch_size=STAGE3_BATCH_SIZE, fast=False, fit="crop"):
+    """
+    Crop listesini mikro-batch'ler halinde sınıflandırır.
+    Girdi sırasıyla aynı sırada (hastalık, güven) listesi döndürür.
+    fast=True ise (PyTorch modelde) predict yerine stage3_fast.FastClassifier kullanılır.
+    """
+    if fast and crops:
+        from stage3_fast import get_fast_classifier  # torch'u yalnızca hızlı yol kullanılırsa yükle
+        classifier = get_fast_classifier(model, batch_size, fit)
+        if classifier is not None:
+            return classifier(crops)
+
+    predictions = []
+    for start in range(0, len(crops), batch_size):
+        d_results = model.predict(crops[start:start + batch_size], verbose=False)
+        for res in d_results:
+            disease_id = res.probs.top1
+            predictions.append((res.names[disease_id], res.probs.top1conf.item()))
+    return predictions
+
+def boxes_to_arrays(result):
+    """Ultralytics sonucundaki tüm kutuları tek seferde numpy'a çevirir: (xyxy, conf, cls)."""
+    if isinstance(result, Detections):
+        return result.xyxy, result.conf, result.cls
+    boxes = result.boxes
+    return boxes.xyxy.cpu().numpy(), boxes.conf.cpu().numpy(), boxes.cls.cpu().numpy().astype(int)
+
+def quadrant_label(name):
+    return name.replace("quadrant_", "Q").replace("Quadrant ", "Q")
+
+def assign_quadrants(tooth_boxes, quad_boxes, policy="first"):
+    """
+    Her diş kutusu için merkezinin düştüğü quadrant'ın indeksini döndürür (yoksa -1).
+    check_containment'ın N x M vektörize hali. Merkez birden çok quadrant'a düşerse:
+      first   -> listedeki ilk quadrant (eski döngüyle aynı sonuç)
+      overlap -> diş kutusuyla kesişim alanı en büyük olan
+      nearest -> merkezi diş merkezine en yakın olan
+    """
+    tooth_boxes = box_ops.as_boxes(tooth_boxes, dtype=float)
+    quad_boxes = box_ops.as_boxes(quad_boxes, dtype=float)
+    if len(tooth_boxes) == 0 or len(quad_boxes) == 0:
+        return np.full(len(tooth_boxes), -1, dtype=int)
+
+    inside = box_ops.centers_inside(tooth_boxes, quad_boxes)
+
+    if policy == "first":
+        idx = inside.argmax(axis=1)
+    elif policy == "overlap":
+        inter = box_ops.intersection_matrix(tooth_boxes, quad_boxes)
+        idx = np.where(inside, inter, -1.0).argmax(axis=1)
+    elif policy == "nearest":
+        tcx, tcy = box_ops.centers(tooth_boxes)
+        qcx, qcy = box_ops.centers(quad_boxes)
+        dist = (tcx[:, None] - qcx) ** 2 + (tcy[:, None] - qcy) ** 2
+        idx = np.where(inside, dist, np.inf).argmin(axis=1)
+    else:
+        raise ValueError(f"Bilinmeyen assign_policy: {policy}")
+
+    return np.where(inside.any(axis=1), idx, -1)
+
+def filter_candidates(boxes, confs, assigned, img_shape, options):
+    """
+    Stage 3'e gidecek kutuları eler: min alan, en-boy oranı, NMS, dedupe, quadrant limiti.
+    Tutulacak kutular için boolean maske ve her adımda kaç kutu düştüğünü döndürür.
+    """
+    h_img, w_img = img_shape[:2]
+    keep = assigned >= 0
+    report = {"stage2_boxes": len(boxes), "unassigned": int((~keep).sum()),
+              "small": 0, "aspect": 0, "nms": 0, "dedupe": 0, "quadrant_cap": 0}
+
+    # Crop boyutu (resim sınırına kırpılmış)
+    clipped = box_ops.clip_boxes(boxes, w_img, h_img)
+    cw = np.clip(clipped[:, 2] - clipped[:, 0], 0, None)
+    ch = np.clip(clipped[:, 3] - clipped[:, 1], 0, None)
+
+    if options["min_crop_area"]:
+        small = keep & (cw * ch < options["min_crop_area"])
+        report["small"] = int(small.sum()); keep &= ~small
+
+    if options["max_aspect"]:
+        ratio = np.maximum(cw, ch) / np.maximum(np.minimum(cw, ch), 1)
+        thin = keep & (ratio > options["max_aspect"])
+        report["aspect"] = int(thin.sum()); keep &= ~thin
+
+    if options["nms_iou"] is not None or options["dedupe_ios"] is not None:
+        idx = np.flatnonzero(keep)
+        order = idx[np.argsort(-confs[idx], kind="stable")]
+        if options["nms_iou"] is not None:
+            survivors = box_ops.greedy_suppress(order, box_ops.iou_matrix(boxes, boxes), options["nms_iou"])
+            report["nms"] = len(order) - len(survivors)
+            order = survivors
+
+        if options["dedupe_ios"] is not None:
+            survivors = box_ops.greedy_suppress(order, box_ops.ios_matrix(boxes, boxes), options["dedupe_ios"])
+            report["dedupe"] = len(order) - len(survivors)
+            order = survivors
+
+        keep = np.zeros_like(keep)
+        keep[order] = True
+
+    if options["max_per_quadrant"]:
+        for q in np.unique(assigned[keep]):
+            idx = np.flatnonzero(keep & (assigned == q))
+            if len(idx) <= options["max_per_quadrant"]: continue
+            dropped = idx[np.argsort(-confs[idx], kind="stable")][options["max_per_quadrant"]:]
+            keep[dropped] = False
+            report["quadrant_cap"] += len(dropped)
+
+    report["crops_saved"] = report["small"] + report["aspect"] + report["nms"] + report["dedupe"] + report["quadrant_cap"]
+    return keep, report
+
+def merge_stats(total, part):
+    """Sayaç sözlüklerini toplar (batch / pipeline raporları için). İç içe sözlükler (timings) de toplanır."""
+    for k, v in part.items():
+        if isinstance(v, dict):
+            merge_stats(total.setdefault(k, {}), v)
+        else:
+            total[k] = total.get(k, 0) + v
+    return total
+
+def add_timing(stats, stage, seconds):
+    """stats verilmişse stats["timings"][stage] süresine ekler (saniye)."""
+    if stats is None: return
+    timings = stats.setdefault("timings", {})
+    timings[stage] = timings.get(stage, 0.0) + seconds
+
+def collect_candidates(img, q_result, t_result, options=None, stats=None):
+    """
+    Stage 2 kutularını quadrant'lara atar, aday elemeyi uygular ve
+    sınıflandırılacak crop'ları toplar. Her aday: (quadrant, diş türü, bbox, crop)
+    stats sözlüğü verilirse eleme sayaçları ve adım süreleri (stats["timings"]) buna eklenir.
+    """
+    options = resolve_options(options)
+    h_img, w_img = img.shape[:2]
+
+    # Kutular tensörden tek seferde alınır
+    q_xyxy, _, q_cls = boxes_to_arrays(q_result)
+    t_xyxy, t_conf, t_cls = boxes_to_arrays(t_result)
+    t_boxes = t_xyxy.astype(int)
+
+    # 3.1: Hiyerarşi Kontrolü (quadrant modunda atama Stage 2'den hazır gelir)
+    t0 = time.perf_counter()
+    assigned = getattr(t_result, "quadrants", None)
+    if assigned is None:
+        assigned = assign_quadrants(t_boxes, q_xyxy, options["assign_policy"])
+    add_timing(stats, "assign", time.perf_counter() - t0)
+
+    # 3.2: Aday Eleme
+    t0 = time.perf_counter()
+    keep, report = filter_candidates(t_boxes, t_conf, assigned, img.shape, options)
+    add_timing(stats, "filter", time.perf_counter() - t0)
+
+    t0 = time.perf_counter()
+    candidates = []
+    for i in np.flatnonzero(keep):
+        tx1, ty1, tx2, ty2 = t_boxes[i].tolist()
+
+        # 3.3: Diş Türü
+        assigned_q = quadrant_label(q_result.names[q_cls[assigned[i]]])
+        tooth_type = t_result.names[t_cls[i]]
+
+        # 3.4: Crop
         tx1_c, ty1_c = max(0, tx1), max(0, ty1)
         tx2_c, ty2_c = min(w_img, tx2), min(h_img, ty2)
         crop = img[ty1_c:ty2_c, tx1_c:tx2_c]
         if crop.size == 0: continue
 
-        d_results = models["stage3"].predict(crop, verbose=False)
-        disease_id = d_results[0].probs.top1
-        disease_name = d_results[0].names[disease_id]
-        conf = d_results[0].probs.top1conf.item()
+        candidates.append((assigned_q, tooth_type, [tx1, ty1, tx2, ty2], crop))
+
+    # Eğitim verisiyle aynı ön işleme (crop'lar tek seferde, thread'in CLAHE nesnesiyle)
+    if options["stage3_clahe"] and candidates:
+        enhanced = apply_clahe_batch([c[3] for c in candidates])
+        candidates = [(q, t, box, crop) for (q, t, box, _), crop in zip(candidates, enhanced)]
+    add_timing(stats, "crop", time.perf_counter() - t0)
 
+    if stats is not None:
+        report["classified"] = len(candidates)
+        merge_stats(stats, report)
+    return candidates
+
+def build_pathologies(candidates, predictions):
+    """Aday + tahmin çiftlerinden sağlıklı olmayan bulguların listesini oluşturur."""
+    detected_pathologies = []
+    for (assigned_q, tooth_type, tooth_box, _), (disease_name, conf) in zip(candidates, predictions):
         # FİLTRE: Sağlıklı dişleri listeye ekleme
         if disease_name == "Healthy": continue
 
@@ -107,10 +639,115 @@ def analyze_image(image_path, models):
             "tooth_type": tooth_type,
             "disease": disease_name,
             "confidence": conf,
-            "bbox": [tx1, ty1, tx2, ty2] # Koordinatları da sakla
+            "bbox": tooth_box # Koordinatları da sakla
         })
+    return detected_pathologies
+
+def analyze_image(image_path, models, options=None, stats=None, hooks=None):
+    """
+    CORE FUNCTION: Resmi analiz eder ve saf veri döndürür.
+    Çizim yapmaz, sadece hesaplar. API bu fonksiyonu kullanacak.
+    options: PIPELINE_OPTIONS anahtarlarından değiştirilmek istenenler.
+    stats: verilirse aday sayaçları (kaç kutu elendi, kaç crop sınıflandı) ve
+           adım süreleri (stats["timings"], saniye) buraya yazılır.
+    hooks: verilirse ölçüm olayları buna gönderilir (pipeline_hooks.PipelineHooks).
+    """
+    options = resolve_options(options)
+    t0 = time.perf_counter()
+    img = cv2.imread(image_path)
+    add_timing(stats, "decode", time.perf_counter() - t0)
+    if img is None: return None, []
+
+    # Stage 1-2-3 tek resimlik batch olarak (aynı kod yolu, aynı hook olayları)
+    return img, analyze_batch([img], models, options=options, stats=stats, hooks=hooks)[0]
+
+def analyze_batch(images, models, stage3_batch_size=STAGE3_BATCH_SIZE, options=None, stats=None, hooks=None):
+    """
+    Önceden okunmuş resim listesini tek seferde analiz eder.
+    Stage 1 ve Stage 2 tüm resimler için tek batch'te çalışır, Stage 3 crop'ları
+    bütün resimlerden havuzlanıp ortak batch'lerde sınıflandırılır.
+    Girdi sırasıyla her resim için bir bulgu listesi döndürür.
+    hooks verilirse resim başına (on_image) ve batch sonunda (on_batch_end) rapor gönderilir;
+    on_batch_end hata durumunda da çağrılır (stats["failed"] = 1), böylece profiler vb. kapanır.
+    hooks=None iken ek sözlük / sayaç oluşturulmaz.
+    """
+    if not images: return []
+    options = resolve_options(options)
+    if hooks is None:
+        return _analyze_batch(images, models, stage3_batch_size, options, stats)
+
+    hooks.on_batch_start(len(images))
+    batch_stats, reports = {}, {}
+    try:
+        outputs = _analyze_batch(images, models, stage3_batch_size, options, batch_stats, reports)
+        for i, pathologies in enumerate(outputs):
+            report = reports.get(i, {"no_quadrant": 1})
+            merge_stats(batch_stats, report)
+            hooks.on_image(report, len(pathologies))
+    except BaseException:
+        batch_stats["failed"] = 1
+        raise
+    finally:
+        hooks.on_batch_end(batch_stats, len(images))
+        if stats is not None:
+            merge_stats(stats, batch_stats)
+    return outputs
+
+def _analyze_batch(images, models, stage3_batch_size, options, stats, reports=None):
+    """analyze_batch gövdesi. reports verilirse aday sayaçları resim başına reports[i]'ye yazılır (hook'lar için)."""
+    # --- Stage 1 + Stage 2 (batch) ---
+    # Quadrant bulunamayan resimler Stage 2'ye hiç girmez
+    q_results, t_results = run_detectors(images, models, options, stats)
+    missing = sum(1 for t_res in t_results if t_res is None)
+    if missing and reports is None:
+        print(f"⚠️ Uyarı: {missing} resimde quadrant bulunamadı.")
+
+    # --- Stage 3: Adayları havuzla ---
+    per_image = {}
+    pooled_crops = []
+    for i, t_res in enumerate(t_results):
+        if t_res is None: continue
+        image_stats = stats if reports is None else reports.setdefault(i, {})
+        candidates = collect_candidates(images[i], q_results[i], t_res, options, image_stats)
+        per_image[i] = (len(pooled_crops), candidates)
+        pooled_crops.extend(c[3] for c in candidates)
+
+    predictions, seconds = _timed_call(classify_crops, models["stage3"], pooled_crops, batch_size=stage3_batch_size,
+                                       fast=options["stage3_fast"], fit=options["stage3_fit"])
+    add_timing(stats, "stage3", seconds)
+
+    outputs = []
+    for i in range(len(images)):
+        if i not in per_image:
+            outputs.append([])
+            continue
+        offset, candidates = per_image[i]
+        outputs.append(build_pathologies(candidates, predictions[offset:offset + len(candidates)]))
+    return outputs
+
+def analyze_images(image_paths, models, batch_size=8, stage3_batch_size=STAGE3_BATCH_SIZE, options=None, stats=None,
+                   hooks=None):
+    """
+    Çok sayıda dosya için batch analiz (arşiv taraması vb.).
+    Her resim için girdi sırasıyla (yol, resim, bulgular) üretir (generator).
+    Okunamayan dosyalar analyze_image ile aynı şekilde (yol, None, []) döner.
+    """
+    def _flush(chunk):
+        readable = [img for _, img in chunk if img is not None]
+        results = iter(analyze_batch(readable, models, stage3_batch_size, options, stats, hooks))
+        for path, img in chunk:
+            yield path, img, (next(results) if img is not None else [])
 
-    return img, detected_pathologies
+    chunk = []
+    for path in image_paths:
+        t0 = time.perf_counter()
+        chunk.append((path, cv2.imread(path)))
+        add_timing(stats, "decode", time.perf_counter() - t0)
+        if len(chunk) >= batch_size:
+            yield from _flush(chunk)
+            chunk = []
+    if chunk:
+        yield from _flush(chunk)
 
 def visualize_results(img, pathologies):
     """
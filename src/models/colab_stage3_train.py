@@ -1,14 +1,41 @@
 import os
+import sys
 import json
+import random
+import cv2
 import torch
 import torch.nn as nn
+from collections import Counter
+from pathlib import Path
+from PIL import Image
+from torch.utils.data import Dataset, DataLoader, WeightedRandomSampler
 from ultralytics import YOLO
+from ultralytics.data.augment import classify_augmentations
+from ultralytics.data.build import seed_worker
+from ultralytics.data.dataset import ClassificationDataset
 from ultralytics.models.yolo.classify import ClassificationTrainer
 
+# augment_stage3 / stage3_balance src/ altında
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from augment_stage3 import get_augmentation, build_transform
+from stage3_balance import TARGET_COUNT
+from crop_store import CropStore
+
 # --- COLAB ve T4 ---
 data = '/content/dataset/stage3_classifier'
 weight = '/content/dataset/stage3_classifier/class_weights.json'
 
+# Dengeleme yöntemi:
+#   "sampler": aug_*.png dosyası üretmeden, sınıf ağırlıklı örnekleme + dataloader işçilerinde anlık augmentation
+#   "files":   stage3_balance.py ile diske yazılmış aug_*.png dosyaları + ağırlıklı loss (eski yöntem)
+BALANCE_MODE = "sampler"
+
+# Train verisi: "packed" -> crop_store.py paketi ({data}/packed/train.bin + .json), "folders" -> PNG klasörleri
+# Paket yoksa klasörlere düşülür. Val her zaman klasörden okunur (küçük, ultralytics validator kullanır).
+# Paket crop_store.FIT="crop" ile (kısa kenar + orta kesim) yazılmalı: val ve YOLO.predict de böyle görür.
+DATA_FORMAT = "packed"
+packed_prefix = f'{data}/packed/train'
+
 class_weights = []
 
 def load_weights():
@@ -31,8 +58,93 @@ class trainer_with_weight(ClassificationTrainer):
             criterion = nn.CrossEntropyLoss(weight=weights_tensor)
         return criterion
 
+class onthefly_augment:
+    """Sınıf ağırlıkları + anlık augmentation (balanced_dataset ve packed_dataset ortak)."""
+    transform = None  # her dataloader işçisinde ilk kullanımda bir kez kurulur
+    aug_prob = {}     # sınıf -> get_augmentation uygulanma olasılığı (sample_weights doldurur)
+
+    def sample_weights(self, target=TARGET_COUNT):
+        """
+        Örnek başına ağırlık: bir epoch'ta her sınıftan beklenen örnek sayısı max(adet, target) olur.
+        Augmentation olasılığı 1 - adet / max(adet, target): diskte de orijinaller temiz kalır,
+        yalnızca target'ın altındaki sınıflara eksik kadar aug kopyası eklenir.
+        (stage3_balance.py'nin diske yazdığı dağılımın aynısı: hem sınıf sayıları hem aug oranı)
+        """
+        counts = Counter(s[1] for s in self.samples)
+        self.aug_prob = {j: 1 - c / max(c, target) for j, c in counts.items()}
+        return [max(counts[j], target) / counts[j] for _, j, *_ in self.samples]
+
+    def make_sample(self, im, j):
+        if random.random() < self.aug_prob.get(j, 0.0):
+            if self.transform is None:
+                self.transform = build_transform()
+            im = get_augmentation(im, self.transform)
+        im = Image.fromarray(cv2.cvtColor(im, cv2.COLOR_BGR2RGB))
+        return {"img": self.torch_transforms(im), "cls": j}
+
+class balanced_dataset(onthefly_augment, ClassificationDataset):
+    """Diskteki aug_* dosyalarını yok sayar, get_augmentation'ı sınıfın aug oranıyla anlık uygular."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.samples = [s for s in self.samples if not Path(s[0]).name.startswith("aug_")]
+
+    def __getitem__(self, i):
+        f, j = self.samples[i][:2]
+        return self.make_sample(cv2.imread(f), j)
+
+class packed_dataset(onthefly_augment, Dataset):
+    """crop_store paketinden okur: klasör taraması ve PNG decode yok, crop'lar memmap'ten kopyasız gelir."""
+
+    def __init__(self, prefix, args, names):
+        self.store = CropStore(prefix)
+        expected = [names[i] for i in sorted(names)]
+        if self.store.classes != expected:
+            raise ValueError(f"Paket sınıfları {self.store.classes} modelinkilerle uyuşmuyor: {expected}")
+        if self.store.fit != "crop":
+            print(f"⚠️ Uyarı: paket '{self.store.fit}' ile hazırlanmış; val ve predict orta kesim kullanır. "
+                  f"Inference'ta stage3_fit='{self.store.fit}' kullanın ya da paketi FIT='crop' ile yeniden üretin.")
+
+        self.samples = [(s["file"], int(j)) for s, j in zip(self.store.sources, self.store.labels)]
+        self.torch_transforms = classify_augmentations(
+            size=args.imgsz, scale=(1.0 - args.scale, 1.0), hflip=args.fliplr, vflip=args.flipud,
+            erasing=args.erasing, auto_augment=args.auto_augment,
+            hsv_h=args.hsv_h, hsv_s=args.hsv_s, hsv_v=args.hsv_v)
+
+    def __len__(self):
+        return len(self.samples)
+
+    def __getitem__(self, i):
+        im, j = self.store[i]
+        return self.make_sample(im, j)
+
+class sampler_loader(DataLoader):
+    # BaseTrainer close_mosaic epoch'unda train_loader.reset() çağırır
+    def reset(self):
+        pass
+
+class trainer_with_sampler(ClassificationTrainer):
+    """Train dataloader'ı ağırlıklı örnekleyici ile kurar; loss ağırlıksız kalır (çift ağırlıklandırma olmasın)."""
+
+    def get_dataloader(self, dataset_path, batch_size=16, rank=0, mode="train"):
+        if mode != "train":
+            return super().get_dataloader(dataset_path, batch_size, rank, mode)
+
+        if DATA_FORMAT == "packed" and os.path.exists(f"{packed_prefix}.json"):
+            dataset = packed_dataset(packed_prefix, self.args, self.data["names"])
+        else:
+            dataset = balanced_dataset(dataset_path, self.args, augment=True, prefix=mode)
+        weights = dataset.sample_weights()
+        generator = torch.Generator()
+        generator.manual_seed(self.args.seed)
+        sampler = WeightedRandomSampler(weights, num_samples=round(sum(weights)), replacement=True, generator=generator)
+        workers = min(os.cpu_count() or 1, self.args.workers)
+        return sampler_loader(dataset, batch_size=batch_size, sampler=sampler, num_workers=workers,
+                              pin_memory=True, worker_init_fn=seed_worker, persistent_workers=workers > 0)
+
 def main():
-    load_weights()
+    if BALANCE_MODE == "files":
+        load_weights()
     model = YOLO('yolov8s-cls.pt')
     
     print(f"Eğitim Başlıyor: {model}")
@@ -61,7 +173,10 @@ def main():
     )
 
     try:
-        if len(class_weights) > 0:
+        if BALANCE_MODE == "sampler":
+            trainer = trainer_with_sampler(overrides=train_settings)
+            trainer.train()
+        elif len(class_weights) > 0:
             trainer = trainer_with_weight(overrides=train_settings)
             trainer.train()
         else:
@@ -0,0 +1,198 @@
+import os
+import time
+import random
+import threading
+import cProfile
+
+# Pipeline ölçüm yüzeyi. analyze_image / analyze_batch / analyze_images'e hooks=... verilirse çağrılır;
+# hooks=None iken hiçbir sayaç/sözlük oluşturulmaz (ek maliyet yalnızca birkaç "is None" kontrolü).
+#
+# Olaylar:
+#   on_batch_start(n_images)         -> analyze_batch başı
+#   on_image(report, n_pathologies)  -> resim başına: stage2_boxes, unassigned, small, ..., classified,
+#                                       no_quadrant ve timings (assign / filter / crop)
+#   on_batch_end(stats, n_images)    -> batch toplamı; timings içinde stage1 / stage2 / stage3 (batch için ortak)
+#                                       hata olsa da çağrılır (stats["failed"] = 1)
+
+# Prometheus histogram sınırları (saniye)
+STAGE_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+COUNT_BUCKETS = (0, 1, 5, 10, 20, 30, 40, 60, 100, 200, 500)
+DROP_REASONS = ("unassigned", "small", "aspect", "nms", "dedupe", "quadrant_cap")
+
+
+class PipelineHooks:
+    """Boş (no-op) hook arayüzü; ihtiyaç duyulan metotlar ezilir."""
+
+    def on_batch_start(self, n_images):
+        pass
+
+    def on_image(self, report, n_pathologies):
+        pass
+
+    def on_batch_end(self, stats, n_images):
+        pass
+
+
+class HookList(PipelineHooks):
+    """Birden çok hook'u sırayla çağırır."""
+
+    def __init__(self, hooks):
+        self.hooks = list(hooks)
+
+    def on_batch_start(self, n_images):
+        for h in self.hooks: h.on_batch_start(n_images)
+
+    def on_image(self, report, n_pathologies):
+        for h in self.hooks: h.on_image(report, n_pathologies)
+
+    def on_batch_end(self, stats, n_images):
+        for h in self.hooks: h.on_batch_end(stats, n_images)
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+        self.sum += value
+        self.count += 1
+
+
+def _labels(labels):
+    return "{" + ",".join(f'{k}="{v}"' for k, v in labels) + "}" if labels else ""
+
+
+class MetricsCollector(PipelineHooks):
+    """
+    Sayaç ve histogramları tutar, Prometheus text formatında dışa verir (thread-safe).
+    Metrik adları prefix ile başlar (varsayılan: tooth_).
+    """
+
+    def __init__(self, prefix="tooth_"):
+        self.prefix = prefix
+        self.lock = threading.Lock()
+        self.counters = {}    # (ad, etiketler) -> değer
+        self.histograms = {}  # (ad, etiketler) -> Histogram
+        self.help = {}
+
+    def inc(self, name, value=1, labels=(), help=""):
+        key = (name, tuple(labels))
+        self.counters[key] = self.counters.get(key, 0) + value
+        self.help.setdefault(name, ("counter", help))
+
+    def observe(self, name, value, buckets, labels=(), help=""):
+        key = (name, tuple(labels))
+        if key not in self.histograms:
+            self.histograms[key] = Histogram(buckets)
+        self.histograms[key].observe(value)
+        self.help.setdefault(name, ("histogram", help))
+
+    def on_image(self, report, n_pathologies):
+        with self.lock:
+            self.inc("images_total", help="Analiz edilen resim sayısı")
+            if report.get("no_quadrant"):
+                self.inc("no_quadrant_total", help="Quadrant bulunamayan resim sayısı")
+                return
+            self.inc("stage2_boxes_total", report.get("stage2_boxes", 0), help="Stage 2 kutu sayısı")
+            for reason in DROP_REASONS:
+                self.inc("candidates_dropped_total", report.get(reason, 0), labels=(("reason", reason),),
+                         help="Stage 3 öncesi elenen aday sayısı (neden: unassigned = quadrant dışında)")
+            self.inc("crops_classified_total", report.get("classified", 0), help="Stage 3'te sınıflanan crop sayısı")
+            self.inc("pathologies_total", n_pathologies, help="Bulunan hastalık sayısı")
+            self.observe("stage2_boxes_per_image", report.get("stage2_boxes", 0), COUNT_BUCKETS,
+                         help="Resim başına Stage 2 kutu sayısı")
+            self.observe("crops_per_image", report.get("classified", 0), COUNT_BUCKETS,
+                         help="Resim başına sınıflanan crop sayısı")
+            for stage, seconds in report.get("timings", {}).items():
+                self.observe("stage_seconds", seconds, STAGE_BUCKETS, labels=(("stage", stage),),
+                             help="Adım süresi (stage1/2/3 batch başına, diğerleri resim başına)")
+
+    def on_batch_end(self, stats, n_images):
+        with self.lock:
+            self.inc("batches_total", help="analyze_batch çağrı sayısı")
+            if stats.get("failed"):
+                self.inc("batch_errors_total", help="Hata ile biten analyze_batch çağrısı sayısı")
+            self.observe("batch_size", n_images, COUNT_BUCKETS, help="Batch başına resim sayısı")
+            for stage in ("decode", "stage1", "stage2", "stage3"):
+                if stage in stats.get("timings", {}):
+                    self.observe("stage_seconds", stats["timings"][stage], STAGE_BUCKETS,
+                                 labels=(("stage", stage),))
+
+    def render(self):
+        """Prometheus text exposition formatı (v0.0.4)."""
+        lines = []
+        with self.lock:
+            for name, (kind, help) in sorted(self.help.items()):
+                full = self.prefix + name
+                if help:
+                    lines.append(f"# HELP {full} {help}")
+                lines.append(f"# TYPE {full} {kind}")
+                if kind == "counter":
+                    for (n, labels), value in sorted(self.counters.items()):
+                        if n == name:
+                            lines.append(f"{full}{_labels(labels)} {value}")
+                    continue
+                for (n, labels), hist in sorted(self.histograms.items(), key=lambda kv: kv[0]):
+                    if n != name: continue
+                    for bound, count in zip(hist.buckets, hist.counts):
+                        lines.append(f"{full}_bucket{_labels(labels + (('le', bound),))} {count}")
+                    lines.append(f"{full}_bucket{_labels(labels + (('le', '+Inf'),))} {hist.count}")
+                    lines.append(f"{full}_sum{_labels(labels)} {hist.sum}")
+                    lines.append(f"{full}_count{_labels(labels)} {hist.count}")
+        return "\n".join(lines) + "\n"
+
+
+class SampledProfiler(PipelineHooks):
+    """
+    Batch'lerin sample_rate oranında bir kısmını profiller ve out_dir'e yazar.
+      kind="cprofile" -> {zaman}_{n}.prof (snakeviz / pstats ile açılır)
+      kind="torch"    -> {zaman}_{n}.json Chrome trace (chrome://tracing)
+    Aynı anda tek profil alınır (cProfile süreç başına tek aktif profiler destekler).
+    """
+
+    def __init__(self, out_dir="../profiles", sample_rate=0.01, kind="cprofile"):
+        if kind not in ("cprofile", "torch"):
+            raise ValueError(f"Bilinmeyen profiler: {kind}")
+        self.out_dir = out_dir
+        self.sample_rate = sample_rate
+        self.kind = kind
+        self.lock = threading.Lock()
+        self.active = None
+        self.owner = None  # profili başlatan thread; active'den önce yazılır
+        self.captured = 0
+
+    def on_batch_start(self, n_images):
+        if random.random() >= self.sample_rate or not self.lock.acquire(blocking=False):
+            return
+        self.owner = threading.get_ident()
+        if self.kind == "cprofile":
+            profiler = cProfile.Profile()
+            profiler.enable()
+        else:
+            import torch
+            profiler = torch.profiler.profile(activities=[torch.profiler.ProfilerActivity.CPU], record_shapes=True)
+            profiler.__enter__()
+        self.active = profiler
+
+    def on_batch_end(self, stats, n_images):
+        if self.owner != threading.get_ident() or self.active is None:
+            return
+        profiler, self.active, self.owner = self.active, None, None
+        os.makedirs(self.out_dir, exist_ok=True)
+        self.captured += 1
+        base = os.path.join(self.out_dir, f"{time.strftime('%Y%m%d-%H%M%S')}_{self.captured}")
+        try:
+            if self.kind == "cprofile":
+                profiler.disable()
+                profiler.dump_stats(f"{base}.prof")
+            else:
+                profiler.__exit__(None, None, None)
+                profiler.export_chrome_trace(f"{base}.json")
+        finally:
+            self.lock.release()
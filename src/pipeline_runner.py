@@ -0,0 +1,297 @@
+import os
+import sys
+import time
+import queue
+import threading
+from functools import partial
+import cv2
+
+from main_pipeline import (
+    load_models, resolve_options, run_detectors, collect_candidates, classify_crops, merge_stats,
+    build_pathologies, visualize_results, STAGE3_BATCH_SIZE
+)
+
+# Kuyruk sonu işareti
+_STOP = object()
+
+
+class MeteredQueue(queue.Queue):
+    """Derinlik ve backpressure metriklerini tutan sınırlı kuyruk."""
+
+    def __init__(self, maxsize):
+        super().__init__(maxsize)
+        self.max_depth = 0
+        self.total_put = 0
+        self.blocked_s = 0.0  # Üreticilerin kuyruk dolu diye beklediği toplam süre
+
+    def put(self, item, block=True, timeout=None):
+        start = time.perf_counter()
+        super().put(item, block, timeout)
+        waited = time.perf_counter() - start
+        with self.mutex:
+            self.total_put += 1
+            self.blocked_s += waited
+            self.max_depth = max(self.max_depth, self._qsize())
+
+
+class _Stage:
+    def __init__(self, name, fn, workers, in_q, out_q, needs_models=False, batched=False):
+        self.name = name
+        self.fn = fn
+        self.workers = workers
+        self.in_q = in_q
+        self.out_q = out_q
+        self.needs_models = needs_models
+        self.batched = batched
+        self.downstream_workers = 1
+        self.processed = 0
+        self.busy_s = 0.0
+        self._alive = workers
+        self._lock = threading.Lock()
+
+    def worker_done(self):
+        # Son çıkan worker bir sonraki aşamanın her worker'ına STOP gönderir
+        with self._lock:
+            self._alive -= 1
+            last = self._alive == 0
+        if last:
+            for _ in range(self.downstream_workers):
+                self.out_q.put(_STOP)
+
+
+class PipelineRunner:
+    """
+    Decode -> Detect (Stage 1 + 2) -> Classify (Stage 3) -> Write aşamalarını
+    ayrı thread'lerde, aralarında sınırlı kuyruklarla çalıştırır.
+    Disk okuma / PNG decode ile model çıkarımı böylece üst üste biner.
+
+    Her aşamanın worker sayısı ayrı ayarlanır. Birden fazla detect/classify
+    worker'ı varsa ek worker'lar kendi model kopyalarını yükler
+    (ultralytics predictor'ları thread-safe değil).
+    """
+
+    def __init__(self, models, decode_workers=2, detect_workers=1, classify_workers=1,
+                 write_workers=1, queue_size=8, output_dir=None,
+                 stage3_batch_size=STAGE3_BATCH_SIZE, model_loader=None, options=None):
+        self.models = models
+        self.options = resolve_options(options)
+        # Ek worker'ların kopyaları hemen yüklenir: bozuk checkpoint worker başlarken yakalanır
+        self.model_loader = model_loader or partial(load_models, lazy=False)
+        self.output_dir = output_dir
+        self.stage3_batch_size = stage3_batch_size
+        self.workers = {
+            "decode": decode_workers,
+            "detect": detect_workers,
+            "classify": classify_workers,
+            "write": write_workers if output_dir else 0,
+        }
+        self.queue_size = queue_size
+        self._stages = []
+        self.candidate_stats = {}  # Aday eleme sayaçları (tüm resimler toplamı)
+        self._stats_lock = threading.Lock()
+
+    # --- Aşama fonksiyonları ---
+    def _decode(self, item, models):
+        item["img"] = cv2.imread(item["path"])
+
+    def _detect(self, item, models):
+        img = item["img"]
+        item["candidates"] = []
+        if img is None: return
+
+        q_results, t_results = run_detectors([img], models, self.options)
+        if t_results[0] is None:
+            print(f"⚠️ Uyarı: Quadrant bulunamadı -> {item['path']}")
+            return
+
+        stats = {}
+        item["candidates"] = collect_candidates(img, q_results[0], t_results[0], self.options, stats)
+        with self._stats_lock:
+            merge_stats(self.candidate_stats, stats)
+
+    def _classify(self, items, models):
+        # Birden fazla resmin crop'ları ortak batch'lerde sınıflandırılır
+        crops = [c[3] for it in items for c in it["candidates"]]
+        predictions = classify_crops(models["stage3"], crops, batch_size=self.stage3_batch_size,
+                                     fast=self.options["stage3_fast"], fit=self.options["stage3_fit"])
+
+        offset = 0
+        for it in items:
+            n = len(it["candidates"])
+            it["pathologies"] = build_pathologies(it["candidates"], predictions[offset:offset + n])
+            it["candidates"] = None  # crop referanslarını bırak
+            offset += n
+
+    def _write(self, item, models):
+        if item["img"] is None: return
+        out_path = os.path.join(self.output_dir, os.path.basename(item["path"]))
+        cv2.imwrite(out_path, visualize_results(item["img"], item["pathologies"]))
+
+    # --- Altyapı ---
+    def _build_stages(self):
+        names = [n for n in ("decode", "detect", "classify", "write") if self.workers[n] > 0]
+        fns = {
+            "decode": (self._decode, False, False),
+            "detect": (self._detect, True, False),
+            "classify": (self._classify, True, True),
+            "write": (self._write, False, False),
+        }
+        queues = [MeteredQueue(self.queue_size) for _ in range(len(names) + 1)]
+        stages = []
+        for i, name in enumerate(names):
+            fn, needs_models, batched = fns[name]
+            stages.append(_Stage(name, fn, self.workers[name], queues[i], queues[i + 1],
+                                 needs_models=needs_models, batched=batched))
+        for stage, nxt in zip(stages, stages[1:]):
+            stage.downstream_workers = nxt.workers
+        return stages
+
+    def _drain(self, stage, first):
+        """Batched aşama için kuyrukta bekleyen resimleri crop limiti dolana kadar toplar."""
+        batch = [first]
+        n_crops = len(first.get("candidates") or [])
+        while n_crops < self.stage3_batch_size:
+            try:
+                item = stage.in_q.get_nowait()
+            except queue.Empty:
+                break
+            if item is _STOP:
+                return batch, True
+            batch.append(item)
+            n_crops += len(item.get("candidates") or [])
+        return batch, False
+
+    def _worker(self, stage, worker_idx):
+        # worker_done her durumda çağrılmalı; yoksa sonraki aşamalar STOP almaz ve run() sonsuza kadar bekler
+        try:
+            self._work(stage, worker_idx)
+        finally:
+            stage.worker_done()
+
+    def _work(self, stage, worker_idx):
+        models = None
+        if stage.needs_models:
+            try:
+                models = self.models if worker_idx == 0 else self.model_loader()
+            except BaseException as e:  # load_models eksik dosyada sys.exit çağırır (thread'de SystemExit)
+                # Kuyruktan hiç almadan çık: resimleri aşamanın diğer worker'ları (en az 0. worker) işler
+                print(f"❌ {stage.name}-{worker_idx}: Model yüklenemedi, worker kapatılıyor: {e!r}")
+                return
+
+        while True:
+            item = stage.in_q.get()
+            if item is _STOP: break
+
+            stopping = False
+            batch = [item]
+            if stage.batched:
+                batch, stopping = self._drain(stage, item)
+
+            todo = [it for it in batch if "error" not in it]
+            start = time.perf_counter()
+            try:
+                if stage.batched:
+                    if todo: stage.fn(todo, models)
+                else:
+                    for it in todo: stage.fn(it, models)
+            except Exception as e:
+                print(f"❌ {stage.name} aşamasında hata: {e}")
+                for it in todo:
+                    it["error"] = str(e)
+                    it.setdefault("pathologies", [])
+
+            with stage._lock:
+                stage.busy_s += time.perf_counter() - start
+                stage.processed += len(batch)
+
+            for it in batch:
+                stage.out_q.put(it)
+            if stopping: break
+
+    def _feed(self, image_paths, first_stage):
+        for idx, path in enumerate(image_paths):
+            first_stage.in_q.put({"index": idx, "path": path})
+        for _ in range(first_stage.workers):
+            first_stage.in_q.put(_STOP)
+
+    def run(self, image_paths, ordered=True):
+        """
+        Resimleri pipeline'dan geçirir, (yol, resim, bulgular, hata) üretir (generator).
+        hata: resim bir aşamada hata verdiyse mesajı, yoksa None (bulgular o zaman boş liste).
+        ordered=True ise sonuçlar girdi sırasıyla döner.
+        """
+        if self.output_dir:
+            os.makedirs(self.output_dir, exist_ok=True)
+
+        self._stages = self._build_stages()
+        threads = [threading.Thread(target=self._feed, args=(image_paths, self._stages[0]), daemon=True)]
+        for stage in self._stages:
+            for k in range(stage.workers):
+                threads.append(threading.Thread(target=self._worker, args=(stage, k),
+                                                name=f"{stage.name}-{k}", daemon=True))
+        for t in threads:
+            t.start()
+
+        out_q = self._stages[-1].out_q
+        pending = {}
+        next_idx = 0
+        while True:
+            item = out_q.get()
+            if item is _STOP: break
+            if not ordered:
+                yield item["path"], item.get("img"), item.get("pathologies", []), item.get("error")
+                continue
+            pending[item["index"]] = item
+            while next_idx in pending:
+                it = pending.pop(next_idx)
+                yield it["path"], it.get("img"), it.get("pathologies", []), it.get("error")
+                next_idx += 1
+
+        for t in threads:
+            t.join()
+
+    def metrics(self):
+        """Aşama bazında kuyruk derinliği, bekleme ve işlem süresi metrikleri."""
+        report = {}
+        for stage in self._stages:
+            report[stage.name] = {
+                "workers": stage.workers,
+                "queue_depth": stage.in_q.qsize(),
+                "max_queue_depth": stage.in_q.max_depth,
+                "blocked_put_s": round(stage.in_q.blocked_s, 4),
+                "processed": stage.processed,
+                "busy_s": round(stage.busy_s, 4),
+            }
+        report["candidates"] = dict(self.candidate_stats)
+        return report
+
+
+def main():
+    if len(sys.argv) < 2:
+        print("Kullanım: python pipeline_runner.py <resim_klasörü> [çıktı_klasörü]")
+        return
+
+    input_dir = sys.argv[1]
+    output_dir = sys.argv[2] if len(sys.argv) > 2 else None
+    paths = sorted(os.path.join(input_dir, f) for f in os.listdir(input_dir)
+                   if f.lower().endswith(('.png', '.jpg', '.jpeg')))
+
+    runner = PipelineRunner(load_models(lazy=False), output_dir=output_dir)
+    start = time.perf_counter()
+    total, failed = 0, 0
+    for path, _, pathologies, error in runner.run(paths):
+        if error:
+            failed += 1
+            print(f" - {os.path.basename(path)}: ❌ {error}")
+            continue
+        total += len(pathologies)
+        print(f" - {os.path.basename(path)}: {len(pathologies)} bulgu")
+
+    elapsed = time.perf_counter() - start
+    print(f"\n✅ {len(paths)} resim, {total} bulgu, {failed} hatalı, {elapsed:.1f} sn")
+    for name, m in runner.metrics().items():
+        print(f"   {name}: {m}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from lazy_import import lazy_module
+
+cv2 = lazy_module("cv2")
+
+# Eğitim verisi hazırlığı (stage2/stage3_prepare, healthy miner) ve inference (main_pipeline) ortak ön işlemesi.
+# Parametreler değişirse hazırlık scriptlerinin manifest özetleri de değişir (işler yeniden yapılır).
+PAD_RATIO = 0.10        # Quadrant crop payı (genişliğin oranı)
+CLAHE_CLIP = 3.0
+CLAHE_TILE = (8, 8)
+
+# cv2 CLAHE nesnesi thread'ler arasında paylaşılamaz; her thread kendi kopyasını bir kez kurar
+_local = threading.local()
+
+
+def get_clahe(clip=CLAHE_CLIP, tile=CLAHE_TILE):
+    """Bu thread'e ait, verilen parametrelerle kurulmuş CLAHE nesnesi."""
+    cache = getattr(_local, "clahe", None)
+    if cache is None:
+        cache = _local.clahe = {}
+    key = (clip, tuple(tile))
+    if key not in cache:
+        cache[key] = cv2.createCLAHE(clipLimit=clip, tileGridSize=tuple(tile))
+    return cache[key]
+
+
+def to_gray(image):
+    """BGR ya da tek kanallı resmi 2 boyutlu gri resme çevirir (zaten griyse kopyalamaz)."""
+    if image.ndim == 3:
+        if image.shape[2] == 1:
+            return image[:, :, 0]
+        return cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    return image
+
+
+def apply_clahe(image, keep_gray=False, clip=CLAHE_CLIP, tile=CLAHE_TILE):
+    """
+    CLAHE kontrast iyileştirmesi. keep_gray=True ise tek kanallı (H x W) döner;
+    aksi halde eski davranış: aynı gri görüntü 3 kanala kopyalanmış BGR.
+    """
+    enhanced = get_clahe(clip, tile).apply(to_gray(image))
+    if keep_gray:
+        return enhanced
+    return cv2.cvtColor(enhanced, cv2.COLOR_GRAY2BGR)
+
+
+def apply_clahe_batch(images, keep_gray=False, clip=CLAHE_CLIP, tile=CLAHE_TILE, workers=None):
+    """
+    Çok sayıda crop'a CLAHE uygular, girdi sırasıyla döndürür.
+    workers > 1 ise crop'lar thread havuzunda işlenir (cv2 GIL'i bırakır, her thread kendi CLAHE'sini kullanır).
+    """
+    if workers and workers > 1 and len(images) > 1:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            return list(pool.map(lambda img: apply_clahe(img, keep_gray, clip, tile), images))
+    return [apply_clahe(img, keep_gray, clip, tile) for img in images]
+
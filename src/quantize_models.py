@@ -0,0 +1,91 @@
+import os
+import json
+from ultralytics import YOLO
+from main_pipeline import MODEL_PATHS, MODEL_TASKS, MODEL_IMGSZ, model_path
+
+# Kalibrasyon ve doğrulama verisi (işlenmiş stage1 / stage2 / stage3 veri setleri)
+CALIB_DATA = {
+    "stage1": "../configs/stage1_quadrant.yaml",
+    "stage2": "../configs/stage2_enumeration.yaml",
+    "stage3": "../data/processed/stage3_classifier",
+}
+
+REPORT_FILE = "../models/quantization_report.json"
+
+
+def quantize_all():
+    """Üç modeli de kalibrasyon verisiyle INT8 OpenVINO modeline çevirir (NNCF post-training quantization)."""
+    for key, path in MODEL_PATHS.items():
+        if not os.path.exists(path):
+            print(f" Hata: Model dosyası eksik -> {path}")
+            continue
+
+        model = YOLO(path, task=MODEL_TASKS[key])
+        out = model.export(format="openvino", int8=True, data=CALIB_DATA[key],
+                           imgsz=MODEL_IMGSZ[key], dynamic=True)
+        print(f"✅ {key} -> INT8: {out}")
+
+
+def _per_class_accuracy(metrics):
+    """Sınıflandırma confusion matrix'inden sınıf bazında doğruluk (satır: tahmin, sütun: gerçek)."""
+    cm = getattr(metrics, "confusion_matrix", None)
+    if cm is None: return {}
+    matrix = cm.matrix
+    names = getattr(metrics, "names", None) or {i: str(i) for i in range(len(matrix))}
+    acc = {}
+    for i in range(len(names)):
+        total = matrix[:, i].sum()
+        acc[names[i]] = float(matrix[i, i] / total) if total > 0 else 0.0
+    return acc
+
+
+def evaluate(key, path):
+    """Modeli val split üzerinde değerlendirir; genel ve sınıf bazında metrikleri döndürür."""
+    model = YOLO(path, task=MODEL_TASKS[key])
+    metrics = model.val(data=CALIB_DATA[key], imgsz=MODEL_IMGSZ[key], split="val", batch=1,
+                        plots=False, verbose=False)
+
+    if MODEL_TASKS[key] == "classify":
+        return {"top1": float(metrics.top1), "top5": float(metrics.top5),
+                "per_class": _per_class_accuracy(metrics)}
+
+    per_class = {metrics.names[c]: float(m) for c, m in enumerate(metrics.box.maps)}
+    return {"map50": float(metrics.box.map50), "map": float(metrics.box.map), "per_class": per_class}
+
+
+def _delta(fp32, int8):
+    return {k: (round(int8[k] - fp32[k], 4) if not isinstance(fp32[k], dict)
+                else {c: round(int8[k][c] - v, 4) for c, v in fp32[k].items() if c in int8[k]})
+            for k in fp32}
+
+
+def accuracy_report():
+    """FP32 (.pt) ve INT8 modelleri karşılaştırır, farkları REPORT_FILE'a yazar."""
+    report = {}
+    for key in MODEL_PATHS:
+        int8_path = model_path(key, "openvino_int8")
+        if not os.path.exists(int8_path):
+            print(f"⚠️ INT8 model yok, atlanıyor -> {int8_path}")
+            continue
+
+        fp32 = evaluate(key, model_path(key, "pytorch"))
+        int8 = evaluate(key, int8_path)
+        report[key] = {"fp32": fp32, "int8": int8, "delta": _delta(fp32, int8)}
+
+        print(f"\n📊 {key} (INT8 - FP32):")
+        for k, v in report[key]["delta"].items():
+            print(f"   - {k}: {v}")
+
+    with open(REPORT_FILE, 'w') as f:
+        json.dump(report, f, indent=4)
+    print(f"\nRapor kaydedildi: {REPORT_FILE}")
+    return report
+
+
+def main():
+    quantize_all()
+    accuracy_report()
+
+
+if __name__ == "__main__":
+    main()
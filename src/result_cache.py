@@ -0,0 +1,154 @@
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+from collections import OrderedDict
+import cv2
+import numpy as np
+from main_pipeline import (
+    MODEL_PATHS, BACKEND, EXECUTION_OPTIONS, model_path, weights_signature, resolve_options, analyze_batch
+)
+
+# Varsayılan limitler
+MEMORY_ENTRIES = 1024
+DISK_MAX_BYTES = 256 * 1024 * 1024
+
+
+def weights_fingerprint(backend=None):
+    """
+    MODEL_PATHS altındaki model dosyalarının (yol, boyut, değişiklik zamanı) özeti.
+    Ağırlık dosyası değişince fingerprint, dolayısıyla tüm cache anahtarları değişir.
+    """
+    h = hashlib.sha1((backend or BACKEND).encode())
+    for key in sorted(MODEL_PATHS):
+        h.update(f"{key}={weights_signature(model_path(key, backend))}".encode())
+    return h.hexdigest()
+
+
+def models_fingerprint(models, backend=None):
+    """Bellekteki modellerin fingerprint'i: ModelRegistry yükleme anındaki imzayı verir, düz sözlükte dosyalar şimdi okunur."""
+    if hasattr(models, "fingerprint"):
+        return models.fingerprint()
+    return weights_fingerprint(backend)
+
+
+class ResultCache:
+    """
+    Resim içeriği + model ağırlıkları + eşik/ayarlar ile anahtarlanan sonuç cache'i.
+    Bellekte LRU, isteğe bağlı olarak SQLite üzerinde boyut sınırlı disk katmanı.
+    Anahtar, bind(models) ile bir kez alınan fingerprint'i kullanır (her istekte dosyalar yeniden okunmaz);
+    böylece sonuçlar onları üreten ağırlıklar altında saklanır.
+    """
+
+    def __init__(self, max_entries=MEMORY_ENTRIES, db_path=None, max_disk_bytes=DISK_MAX_BYTES, backend=None):
+        self.max_entries = max_entries
+        self.max_disk_bytes = max_disk_bytes
+        self.backend = backend
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.fingerprint = None
+        self._bound = None
+
+        self._db = None
+        if db_path:
+            self._db = sqlite3.connect(db_path, check_same_thread=False)
+            self._db.execute("CREATE TABLE IF NOT EXISTS results ("
+                             "key TEXT PRIMARY KEY, value TEXT, size INTEGER, accessed REAL)")
+            self._db.execute("CREATE INDEX IF NOT EXISTS idx_accessed ON results(accessed)")
+            self._db.commit()
+
+    def bind(self, models):
+        """Cache'i bu modellere bağlar: anahtarın ağırlık kısmı yüklenen modellerden bir kez alınır."""
+        self.fingerprint = models_fingerprint(models, self.backend)
+        self._bound = models
+        return self
+
+    def make_key(self, image_bytes, options=None):
+        if self.fingerprint is None:
+            raise RuntimeError("ResultCache modellere bağlanmadı (önce bind(models) çağrılmalı)")
+        # Sonucu değiştirmeyen çalışma ayarları anahtara girmez (aynı analiz cache'ten döner)
+        options = {k: v for k, v in resolve_options(options).items() if k not in EXECUTION_OPTIONS}
+        h = hashlib.sha256(image_bytes)
+        h.update(self.fingerprint.encode())
+        h.update(json.dumps(options, sort_keys=True, default=str).encode())
+        return h.hexdigest()
+
+    def get(self, key):
+        with self._lock:
+            value = self._memory.get(key)
+            if value is not None:
+                self._memory.move_to_end(key)
+            elif self._db is not None:
+                row = self._db.execute("SELECT value FROM results WHERE key = ?", (key,)).fetchone()
+                if row:
+                    value = row[0]
+                    self._db.execute("UPDATE results SET accessed = ? WHERE key = ?", (time.time(), key))
+                    self._db.commit()
+                    self._remember(key, value)
+
+            if value is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        # Her seferinde yeni kopya: çağıran sonucu değiştirse de cache bozulmaz
+        return json.loads(value)
+
+    def put(self, key, pathologies):
+        value = json.dumps(pathologies)
+        with self._lock:
+            self._remember(key, value)
+            if self._db is not None:
+                self._db.execute("INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?)",
+                                 (key, value, len(value), time.time()))
+                self._evict_disk()
+                self._db.commit()
+
+    def _remember(self, key, value):
+        self._memory[key] = value
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def _evict_disk(self):
+        # En uzun süredir kullanılmayanları toplam boyut sınırın altına inene kadar sil
+        total = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM results").fetchone()[0]
+        while total > self.max_disk_bytes:
+            rows = self._db.execute("SELECT key, size FROM results ORDER BY accessed LIMIT 64").fetchall()
+            if not rows: break
+            for key, size in rows:
+                self._db.execute("DELETE FROM results WHERE key = ?", (key,))
+                total -= size
+                if total <= self.max_disk_bytes: break
+
+    def analyze(self, image_path, models, options=None):
+        """analyze_image ile aynı çıktı; aynı resim + aynı modeller için sonucu cache'ten verir."""
+        try:
+            with open(image_path, 'rb') as f:
+                data = f.read()
+        except OSError:
+            return None, []
+
+        img = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR)
+        if img is None: return None, []
+
+        if self._bound is not models:
+            self.bind(models)
+        key = self.make_key(data, options)
+        cached = self.get(key)
+        if cached is not None:
+            return img, cached
+
+        pathologies = analyze_batch([img], models, options=options)[0]
+        self.put(key, pathologies)
+        return img, pathologies
+
+    def stats(self):
+        with self._lock:
+            report = {"hits": self.hits, "misses": self.misses, "memory_entries": len(self._memory)}
+            if self._db is not None:
+                count, size = self._db.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM results").fetchone()
+                report.update({"disk_entries": count, "disk_bytes": size})
+        return report
@@ -3,6 +3,8 @@ import json
 import shutil
 import random
 from pathlib import Path
+from dataset_builder import build, file_stat, task_digest, atomic_write_text, WORKERS
+from box_ops import xywh_to_yolo
 
 #Configuration
 BASE_DIR = Path("../data")
@@ -10,75 +12,96 @@ QUADRANT_DIR = BASE_DIR / "raw/train/training_data/quadrant"
 IMAGE_DIR = QUADRANT_DIR / "xrays"
 JSON_PATH = QUADRANT_DIR / "train_quadrant.json"
 OUTPUT_DIR = BASE_DIR / "processed/stage1_quadrant"
+MANIFEST_PATH = OUTPUT_DIR / ".manifest.json"
 
-#Create directories
-for split in ['train', 'val']:
-    os.makedirs(f"{OUTPUT_DIR}/images/{split}", exist_ok=True)
-    os.makedirs(f"{OUTPUT_DIR}/labels/{split}", exist_ok=True)
-
-#Load data
-with open(JSON_PATH, 'r') as f:
-    data = json.load(f)
-
-#Group annotations
-annotations_map = {}
-for ann in data['annotations']:
-    img_id = ann['image_id']
-    if img_id not in annotations_map:
-        annotations_map[img_id] = []
-    annotations_map[img_id].append(ann)
-
-all_images = data['images']
-random.seed(42)
-random.shuffle(all_images)
-split_index = int(len(all_images) * 0.9)
-
-train_images = all_images[:split_index]
-val_images = all_images[split_index:]
-
-# Process images
-def procces(images, split_name):
-    count = 0
+# Çıktı formatı değişirse artırılır (manifest'teki eski işler geçersiz olur)
+FORMAT_VERSION = 1
+
+# Process one image (runs in worker process)
+def process_image(task):
+    img_info = task["img_info"]
+    src_path = task["src_path"]
+    dst_img_path = task["dst_img_path"]
+    dst_label_path = task["dst_label_path"]
+
+    #Copy Image
+    tmp_path = f"{dst_img_path}.tmp{os.getpid()}"
+    shutil.copy(src_path, tmp_path)
+    os.replace(tmp_path, dst_img_path)
+
+    #Convert to YOLO Format (YOLO Normalized)
+    anns = task["anns"]
+    norm = xywh_to_yolo([ann['bbox'] for ann in anns], img_info['width'], img_info['height'])
+
+    yolo_lines = []
+    for ann, (x_center, y_center, w_norm, h_norm) in zip(anns, norm):
+        # Categories: 1,2,3,4 -> YOLO: 0,1,2,3
+        class_id = ann['category_id']
+
+        yolo_lines.append(f"{class_id} {x_center:.8f} {y_center:.8f} {w_norm:.8f} {h_norm:.8f}")
+
+    # 3. Write Label File
+    atomic_write_text(dst_label_path, "\n".join(yolo_lines))
+    return {"outputs": [dst_img_path, dst_label_path], "result": 1}
+
+# Build tasks for one split
+def make_tasks(images, split_name, annotations_map):
+    tasks = []
     for img_info in images:
         img_id = img_info['id']
         file_name = img_info['file_name']
-        
+
         # Paths
         src_path = f"{IMAGE_DIR}/{file_name}"
         dst_img_path = f"{OUTPUT_DIR}/images/{split_name}/{file_name}"
         dst_label_path = f"{OUTPUT_DIR}/labels/{split_name}/{file_name.replace('.png', '.txt').replace('.jpg', '.txt')}"
-        
-        #Copy Image
+
         if not os.path.exists(src_path):
             continue
-        shutil.copy(src_path, dst_img_path)
-
-        #Convert to YOLO Format
-        yolo_lines = []
-        if img_id in annotations_map:
-            for ann in annotations_map[img_id]:
-                
-                x, y, w, h = ann['bbox']
-                
-                #YOLO Normalized
-                x_center = (x + w / 2) / img_info['width']
-                y_center = (y + h / 2) / img_info['height']
-                w_norm = w / img_info['width']
-                h_norm = h / img_info['height']
-                
-                # Categories: 1,2,3,4 -> YOLO: 0,1,2,3
-                class_id = ann['category_id']
-                
-                yolo_lines.append(f"{class_id} {x_center:.8f} {y_center:.8f} {w_norm:.8f} {h_norm:.8f}")
-    
-        # 3. Write Label File
-        with open(dst_label_path, 'w') as f:
-            f.write("\n".join(yolo_lines))
-    
-        count += 1
-    return count
-
-procces(train_images, 'train')
-print("train set is ready.")
-procces(val_images, 'val')
-print("val set is ready.")
\ No newline at end of file
+
+        anns = annotations_map.get(img_id, [])
+        tasks.append({
+            "id": f"{split_name}/{file_name}",
+            "digest": task_digest(file_stat(src_path), img_info, anns, FORMAT_VERSION),
+            "img_info": img_info,
+            "anns": anns,
+            "src_path": src_path,
+            "dst_img_path": dst_img_path,
+            "dst_label_path": dst_label_path,
+        })
+    return tasks
+
+def main(workers=WORKERS):
+    #Create directories
+    for split in ['train', 'val']:
+        os.makedirs(f"{OUTPUT_DIR}/images/{split}", exist_ok=True)
+        os.makedirs(f"{OUTPUT_DIR}/labels/{split}", exist_ok=True)
+
+    #Load data
+    with open(JSON_PATH, 'r') as f:
+        data = json.load(f)
+
+    #Group annotations
+    annotations_map = {}
+    for ann in data['annotations']:
+        img_id = ann['image_id']
+        if img_id not in annotations_map:
+            annotations_map[img_id] = []
+        annotations_map[img_id].append(ann)
+
+    all_images = data['images']
+    random.seed(42)
+    random.shuffle(all_images)
+    split_index = int(len(all_images) * 0.9)
+
+    train_images = all_images[:split_index]
+    val_images = all_images[split_index:]
+
+    # Process images
+    tasks = make_tasks(train_images, 'train', annotations_map) + make_tasks(val_images, 'val', annotations_map)
+    build(tasks, process_image, MANIFEST_PATH, workers=workers, desc="Stage 1")
+    print("train set is ready.")
+    print("val set is ready.")
+
+if __name__ == "__main__":
+    main()
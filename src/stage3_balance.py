@@ -1,86 +1,153 @@
 import os
+import sys
 import glob
 import cv2
 import random
 import numpy as np
-from tqdm import tqdm
-from augment_stage3 import get_augmentation
+from functools import lru_cache
+from augment_stage3 import get_augmentation, build_transform
+from dataset_builder import build, file_stat, task_digest, atomic_imwrite, WORKERS
 
 DATA_DIR = "../data/processed/stage3_classifier/train"
+MANIFEST_PATH = f"{DATA_DIR}/.manifest_balance.json"
 
-TARGET_COUNT = 1000 
+TARGET_COUNT = 1000
 
-def clean_old_augmentations():
+SEED = 42
+SHARD_SIZE = 100      # Bir işçiye tek seferde verilen augmentation sayısı
+CACHE_SIZE = 4096     # İşçi başına bellekte tutulan kaynak resim sayısı
+
+# Augmentation pipeline'ı veya isimlendirme değişirse artırılır (eski shard'lar geçersiz olur)
+AUG_VERSION = 1
+
+# İşçi sürecinde bir kez kurulur
+_transform = None
+
+def clean_old_augmentations(keep=()):
+    """keep içinde olmayan aug_* dosyalarını siler."""
     if not os.path.exists(DATA_DIR):
         print(f"❌ Klasör bulunamadı: {DATA_DIR}")
         return
 
+    keep = set(keep)
     total_removed = 0
     for class_name in os.listdir(DATA_DIR):
         class_path = os.path.join(DATA_DIR, class_name)
         if not os.path.isdir(class_path): continue
-        
+
         # Remove old augmentations
         for f in glob.glob(os.path.join(class_path, "aug_*.png")):
+            if f in keep: continue
             try:
                 os.remove(f)
                 total_removed += 1
             except OSError as e:
                 print(f"Error removing {f}: {e}")
+    return total_removed
+
+@lru_cache(maxsize=CACHE_SIZE)
+def _load_image(path):
+    return cv2.imread(path)
+
+def augment_shard(task):
+    """Bir shard'ı üretir (işçi sürecinde). Aynı seed + aynı kaynaklar -> aynı çıktı."""
+    global _transform
+    if _transform is None:
+        _transform = build_transform()
+
+    random.seed(task["seed"])
+    np.random.seed(task["seed"] % (2 ** 32))
+    cv2.setRNGSeed(task["seed"] % (2 ** 31))
 
-def balance_classes():
+    outputs = []
+    for n, src_img_name in task["items"]:
+        img = _load_image(os.path.join(task["class_dir"], src_img_name))
+        if img is None: continue
+
+        # --- Advanced Augmentation (Albumentations) ---
+        try:
+            aug_img = get_augmentation(img, _transform)
+        except Exception as e:
+            print(f"Augmentation Hatası: {e}")
+            continue
+
+        # Kaydet: aug_{sayi}_{orijinal_isim}
+        new_name = f"aug_{n}_{os.path.splitext(src_img_name)[0]}.png"
+        save_path = os.path.join(task["class_dir"], new_name)
+        atomic_imwrite(save_path, aug_img)
+        outputs.append(save_path)
+    return {"outputs": outputs, "result": len(outputs)}
+
+def plan_balance(target=None, seed=SEED):
+    """Sınıf başına mevcut/üretilecek resim sayısını ve kaynak seçimlerini belirler (diske yazmaz)."""
+    target = TARGET_COUNT if target is None else target
+    plan = {}
+    for cls in sorted(os.listdir(DATA_DIR)):
+        class_dir = os.path.join(DATA_DIR, cls)
+        if not os.path.isdir(class_dir): continue
+
+        images = sorted(f for f in os.listdir(class_dir) if f.endswith(('.png', '.jpg', '.jpeg')) and not f.startswith('aug_'))
+        count = len(images)
+        needed = max(0, target - count) if count else 0
+
+        # Kaynak seçimi sınıfa özel RNG ile: çıktı işçi sayısından bağımsız
+        rng = random.Random(f"{seed}/{cls}")
+        plan[cls] = {
+            "class_dir": class_dir,
+            "images": images,
+            "count": count,
+            "needed": needed,
+            "sources": [rng.choice(images) for _ in range(needed)],
+        }
+    return plan
+
+def make_tasks(plan, seed=SEED, shard_size=SHARD_SIZE):
+    tasks = []
+    for cls, p in plan.items():
+        if not p["needed"]: continue
+        sigs = {name: file_stat(os.path.join(p["class_dir"], name)) for name in set(p["sources"])}
+
+        for start in range(0, p["needed"], shard_size):
+            items = list(enumerate(p["sources"][start:start + shard_size], start))
+            shard_seed = int(task_digest(seed, cls, start)[:8], 16)
+            tasks.append({
+                "id": f"{cls}/{start}",
+                "digest": task_digest([(n, src, sigs[src]) for n, src in items], shard_seed, AUG_VERSION),
+                "class_dir": p["class_dir"],
+                "items": items,
+                "seed": shard_seed,
+            })
+    return tasks
+
+def print_plan(plan):
+    print(f"⚖️ Classes Balancing (Target: {TARGET_COUNT}, Albumentations)...")
+    for cls, p in plan.items():
+        if p["count"] == 0:
+            print(f"   ⚠️ {cls}: kaynak resim yok, atlanıyor.")
+        elif p["needed"]:
+            print(f"   ➕ {cls}: {p['count']} + {p['needed']} adet yeni veri üretilecek...")
+        else:
+            print(f"   ✅ {cls}: {p['count']} (yeterli)")
+
+def balance_classes(dry_run=False, workers=WORKERS):
     if not os.path.exists(DATA_DIR):
         print(f"❌ Klasör bulunamadı: {DATA_DIR}")
         return
 
-    # cleaning
-    clean_old_augmentations()
-    
-    classes = [d for d in os.listdir(DATA_DIR) if os.path.isdir(os.path.join(DATA_DIR, d))]
-    print(f"⚖️ Classes Balancing (Target: {TARGET_COUNT}, Albumentations)...")
-    
-    for cls in classes:
-        class_dir = os.path.join(DATA_DIR, cls)
-        images = [f for f in os.listdir(class_dir) if f.endswith(('.png', '.jpg', '.jpeg')) and not f.startswith('aug_')]
-        count = len(images)
-        
-        
-        if count >= TARGET_COUNT:
-            continue
-        
-        needed = TARGET_COUNT - count
-        print(f"   ➕ {needed} adet yeni veri üretilecek...")
-        
-        if count == 0:
-            continue
+    plan = plan_balance()
+    print_plan(plan)
+    if dry_run:
+        return plan
 
-        generated = 0
-        pbar = tqdm(total=needed, desc=f"   Üretiliyor ({cls})")
-        
-        while generated < needed:
-            # Rastgele bir orijinal resim seç
-            src_img_name = random.choice(images)
-            src_img_path = os.path.join(class_dir, src_img_name)
-            img = cv2.imread(src_img_path)
-            
-            if img is None: continue
-            
-            # --- Advanced Augmentation (Albumentations) ---
-            try:
-                aug_img = get_augmentation(img)
-            except Exception as e:
-                print(f"Augmentation Hatası: {e}")
-                continue
-            
-            # Kaydet: aug_{sayi}_{orijinal_isim}
-            new_name = f"aug_{generated}_{os.path.splitext(src_img_name)[0]}.png"
-            cv2.imwrite(os.path.join(class_dir, new_name), aug_img)
-            
-            generated += 1
-            pbar.update(1)
-            
-        pbar.close()
+    tasks = make_tasks(plan)
+    build(tasks, augment_shard, MANIFEST_PATH, workers=workers, desc="Augmentation")
+
+    # Plandaki dosyalar dışında kalan eski augmentation'ları temizle
+    keep = {os.path.join(t["class_dir"], f"aug_{n}_{os.path.splitext(src)[0]}.png")
+            for t in tasks for n, src in t["items"]}
+    clean_old_augmentations(keep)
+    return plan
 
 
 if __name__ == "__main__":
-    balance_classes()
\ No newline at end of file
+    balance_classes(dry_run="--dry-run" in sys.argv[1:])
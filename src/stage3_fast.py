@@ -0,0 +1,110 @@
+import threading
+import weakref
+import cv2
+import numpy as np
+import torch
+from crop_store import PAD_COLOR
+
+# Stage 3 için YOLO.predict'siz sınıflandırma yolu (yalnızca PyTorch .pt modeller).
+# predict her crop için PIL'e çevirir, yeniden boyutlar, tensöre çevirip normalize eder (her adımda yeni dizi).
+# Burada crop'lar kaynak resmin görünümleri olarak alınır, doğrudan önceden ayrılmış uint8 batch tamponuna
+# boyutlanır ve tek kopyayla (uint8 NHWC -> float NCHW) modele verilir.
+#
+# Ön işleme:
+#   "crop"      -> predict ile aynı: kısa kenar imgsz'ye, ortadan imgsz x imgsz kesilir
+#   "letterbox" -> crop_store.letterbox ile aynı: oran korunur, kalan PAD_COLOR
+#                  (yalnızca FIT="letterbox" ile paketlenmiş veriyle eğitilmiş modeller için)
+# Boyutlama cv2 ile yapılır (predict PIL kullanır), güven değerleri predict'ten çok az farklı olabilir.
+IMGSZ = 224
+FIT_MODES = ("crop", "letterbox")
+
+
+def fit_into(crop, slot, fit="crop", color=PAD_COLOR):
+    """BGR crop'u slot'a (imgsz x imgsz x 3 uint8 tampon satırı) RGB olarak yazar; ara resim ayırmaz."""
+    if crop.ndim == 2 or crop.shape[2] == 1:
+        crop = cv2.cvtColor(crop, cv2.COLOR_GRAY2BGR)
+    size = slot.shape[0]
+    h, w = crop.shape[:2]
+
+    if fit == "crop":
+        # Kısa kenara ölçekle + ortadan kes == kaynakta ortadaki kareyi al + kareyi ölçekle
+        side = min(h, w)
+        top, left = int(round((h - side) / 2)), int(round((w - side) / 2))
+        src, dst = crop[top:top + side, left:left + side], slot
+    else:
+        scale = size / max(h, w)
+        nw, nh = max(1, round(w * scale)), max(1, round(h * scale))
+        top, left = (size - nh) // 2, (size - nw) // 2
+        slot[:] = color
+        src, dst = crop, slot[top:top + nh, left:left + nw]
+
+    interp = cv2.INTER_AREA if dst.shape[0] < src.shape[0] else cv2.INTER_LINEAR
+    cv2.resize(src, (dst.shape[1], dst.shape[0]), dst=dst, interpolation=interp)
+    cv2.cvtColor(slot, cv2.COLOR_BGR2RGB, dst=slot)
+    return slot
+
+
+class FastClassifier:
+    """
+    YOLO sınıflandırma modelini predict'i atlayarak çalıştırır.
+    Tamponlar bir kez ayrılır ve her çağrıda yeniden kullanılır (çağrılar kilitle sıraya girer).
+    Çağrı: crop listesi -> girdi sırasıyla (hastalık, güven) listesi (classify_crops ile aynı biçim).
+    """
+
+    def __init__(self, model, batch_size=32, imgsz=IMGSZ, fit="crop"):
+        if fit not in FIT_MODES:
+            raise ValueError(f"fit şunlardan biri olmalı: {FIT_MODES}")
+        net = model.model
+        # predict'teki AutoBackend gibi Conv+BN katmanlarını birleştir (zaten birleşikse bir şey yapmaz)
+        self.net = net.fuse(verbose=False) if hasattr(net, "fuse") else net
+        self.net.eval()
+        param = next(self.net.parameters())
+        self.names = model.names
+        self.batch_size = batch_size
+        self.fit = fit
+
+        self.host = np.empty((batch_size, imgsz, imgsz, 3), dtype=np.uint8)
+        self.host_tensor = torch.from_numpy(self.host)  # aynı bellek, kopya yok
+        self.input = torch.empty((batch_size, 3, imgsz, imgsz), dtype=param.dtype, device=param.device)
+        self.lock = threading.Lock()
+
+    def __call__(self, crops):
+        predictions = []
+        with self.lock, torch.inference_mode():
+            for start in range(0, len(crops), self.batch_size):
+                chunk = crops[start:start + self.batch_size]
+                n = len(chunk)
+                for i, crop in enumerate(chunk):
+                    fit_into(crop, self.host[i], self.fit)
+
+                x = self.input[:n]
+                x.copy_(self.host_tensor[:n].permute(0, 3, 1, 2))  # tür + cihaz dönüşümü tek kopyada
+                x.mul_(1 / 255)
+
+                out = self.net(x)
+                probs = out[0] if isinstance(out, (list, tuple)) else out  # eval: (softmax, logits)
+                conf, top1 = probs.max(1)
+                predictions.extend((self.names[k], c) for k, c in zip(top1.tolist(), conf.tolist()))
+        return predictions
+
+
+# Model başına kurulmuş sınıflandırıcılar (model silinince kendiliğinden düşer)
+_classifiers = weakref.WeakKeyDictionary()
+_classifiers_lock = threading.Lock()
+
+
+def supports_fast(model):
+    """Hızlı yol yalnızca ağırlıkları bellekte torch modülü olan (.pt) modellerde çalışır."""
+    return isinstance(getattr(model, "model", None), torch.nn.Module)
+
+
+def get_fast_classifier(model, batch_size=32, fit="crop"):
+    """model için (batch_size, fit) ayarlı FastClassifier; desteklenmeyen backend'de None."""
+    if not supports_fast(model):
+        return None
+    with _classifiers_lock:
+        per_model = _classifiers.setdefault(model, {})
+        key = (batch_size, fit)
+        if key not in per_model:
+            per_model[key] = FastClassifier(model, batch_size, fit=fit)
+        return per_model[key]
@@ -1,126 +1,174 @@
-import json, os, cv2
+import json, os, cv2, random
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
 from ultralytics import YOLO
-from stage2_prepare import apply_clahe
-from stage3_prepare import datasets, OUTPUT_DIR
+from preprocess import apply_clahe_batch, CLAHE_CLIP, CLAHE_TILE
+from stage3_prepare import datasets, OUTPUT_DIR, PACK_STORE, KEEP_GRAY
+from crop_store import pack_dataset
+from dataset_builder import Manifest, file_hash, file_stat, task_digest, atomic_imwrite, WORKERS
+from main_pipeline import predict_grouped
+from box_ops import intersection_matrix, iou_matrix, clip_boxes, xywh_to_xyxy
 
 
 
-MODEL_PATH = "../models/stage2_m_640/weights/best.pt" 
+MODEL_PATH = "../models/stage2_m_640/weights/best.pt"
+MANIFEST_PATH = f"{OUTPUT_DIR}/.manifest_healthy.json"
+
+CONF = 0.5
+BATCH_SIZE = 16   # Stage 2'ye tek seferde giden resim sayısı
+SEED = 42
 
 def calculate_iou(box1, box2):
     """
     İki kutu arasındaki örtüşme oranını (IoU) hesaplar.
     box: [x1, y1, x2, y2] formatında olmalı.
     """
-    x1 = max(box1[0], box2[0])
-    y1 = max(box1[1], box2[1])
-    x2 = min(box1[2], box2[2])
-    y2 = min(box1[3], box2[3])
-
-    intersection = max(0, x2 - x1) * max(0, y2 - y1)
-    area1 = (box1[2] - box1[0]) * (box1[3] - box1[1])
-    area2 = (box2[2] - box2[0]) * (box2[3] - box2[1])
-    
-    union = area1 + area2 - intersection
-    return intersection / union if union > 0 else 0
+    return float(iou_matrix(box1, box2)[0, 0])
+
+def seed_everything(seed=SEED):
+    import torch
+    random.seed(seed)
+    np.random.seed(seed)
+    torch.manual_seed(seed)
+
+def save_healthy_crops(img, pred_boxes, known_diseases, file_name, save_dir):
+    """Hiçbir hastalık kutusuyla çakışmayan tahminleri CLAHE uygulayıp kaydeder, yazılan dosyaları döndürür."""
+    pred_boxes = pred_boxes[:, :4].astype(int)
+
+    # Çakışma Kontrolü (STRICT MODE)
+    # Eğer tahmin edilen kutu, herhangi bir hastalık kutusuyla 1 piksel bile çakışıyorsa
+    # onu "Sağlam" olarak KABUL ETME. Risk alma.
+    is_sick = np.zeros(len(pred_boxes), dtype=bool)
+    if len(known_diseases) and len(pred_boxes):
+        is_sick = (intersection_matrix(pred_boxes, known_diseases) > 0).any(axis=1)
+
+    # SADECE SAĞLAMSA KAYDET
+    outputs = []
+    h_img, w_img = img.shape[:2]
+    clipped = clip_boxes(pred_boxes, w_img, h_img)
+    name_without_ext = os.path.splitext(file_name)[0]
+    indices, crops = [], []
+    for i in np.flatnonzero(~is_sick):
+        x1, y1, x2, y2 = clipped[i].tolist()
+
+        crop = img[y1:y2, x1:x2]
+        if crop.size == 0: continue
+        indices.append(i)
+        crops.append(crop)
+
+    for i, crop in zip(indices, apply_clahe_batch(crops, keep_gray=KEEP_GRAY)):
+        save_name = f"{name_without_ext}_h_{i}.png"
+        save_path = os.path.join(save_dir, save_name)
+
+        atomic_imwrite(save_path, crop)
+        outputs.append(save_path)
+    return outputs
+
+def _predict_chunk(model, images):
+    """Batch tahmin; batch hata verirse bozuk resmi atlamak için tek tek dener."""
+    try:
+        return predict_grouped(model, images, verbose=False, conf=CONF)
+    except Exception:
+        results = []
+        for img in images:
+            try:
+                results.append(model.predict(img, verbose=False, conf=CONF)[0])
+            except Exception:
+                # Bozuk resim vs varsa atla
+                results.append(None)
+        return results
 
-def mine_healthy_teeth():
+def mine_healthy_teeth(workers=WORKERS):
 
+    seed_everything(SEED)
     model = YOLO(MODEL_PATH)
-    
+    model_sig = file_hash(MODEL_PATH)
+    manifest = Manifest(MANIFEST_PATH)
+
     total_healthy = 0
 
-    for info in datasets:
-        split = info["split"]
-        img_dir = info["img_dir"]
-        json_path = info["json_path"]
-        
-        
-        if not os.path.exists(json_path):
-            print("JSON Bulunamadı")
-            continue
-
-        with open(json_path, 'r') as f:
-            data = json.load(f)
-            
-        # Ground Truth Kutularını Hazırla
-        gt_boxes_map = {}
-        images_map = {img['id']: img['file_name'] for img in data['images']}
-        
-        for ann in data['annotations']:
-            img_id = ann['image_id']
-            x, y, w, h = ann['bbox']
-            box = [x, y, x + w, y + h] # [x1, y1, x2, y2]
-            
-            if img_id not in gt_boxes_map:
-                gt_boxes_map[img_id] = []
-            gt_boxes_map[img_id].append(box)
-
-        save_dir = os.path.join(OUTPUT_DIR, split, "Healthy")
-        os.makedirs(save_dir, exist_ok=True)
-
-        valid_extensions = ('.PNG')
-        img_files = [os.path.join(img_dir, f) for f in os.listdir(img_dir) if f.endswith(valid_extensions)]
-        
-
-        for img_path in img_files:
-            file_name = os.path.basename(img_path)
-            
-            try:
-                results = model.predict(img_path, verbose=False, conf=0.5)
-            except Exception as e:
-                # Bozuk resim vs varsa atla
+    # Decode ve crop/CLAHE/yazma thread'lerde (cv2 GIL'i bırakır), inference ana thread'de
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for info in datasets:
+            split = info["split"]
+            img_dir = info["img_dir"]
+            json_path = info["json_path"]
+
+
+            if not os.path.exists(json_path):
+                print("JSON Bulunamadı")
                 continue
 
-            if not results: continue
-            
-            # Görüntüyü oku
-            img = cv2.imread(img_path)
-            if img is None: continue
-            
-            current_img_id = None
-            for k, v in images_map.items():
-                if v == file_name:
-                    current_img_id = k
-                    break
-            
-            known_diseases = gt_boxes_map.get(current_img_id, [])
-
-            for i, box in enumerate(results[0].boxes.xyxy.cpu().numpy()):
-                x1, y1, x2, y2 = map(int, box[:4])
-                pred_box = [x1, y1, x2, y2]
-                
-                # Çakışma Kontrolü (STRICT MODE)
-                # Eğer tahmin edilen kutu, herhangi bir hastalık kutusuyla 1 piksel bile çakışıyorsa
-                # onu "Sağlam" olarak KABUL ETME. Risk alma.
-                is_sick = False
-                for disease_box in known_diseases:
-                    # IoU yerine Intersection > 0 kontrolü
-                    x_overlap = max(0, min(pred_box[2], disease_box[2]) - max(pred_box[0], disease_box[0]))
-                    y_overlap = max(0, min(pred_box[3], disease_box[3]) - max(pred_box[1], disease_box[1]))
-                    if x_overlap * y_overlap > 0:
-                        is_sick = True
-                        break
-                
-                # SADECE SAĞLAMSA KAYDET
-                if not is_sick:
-                    h_img, w_img = img.shape[:2]
-                    x1 = max(0, x1); y1 = max(0, y1)
-                    x2 = min(w_img, x2); y2 = min(h_img, y2)
-
-                    crop = img[y1:y2, x1:x2]
-                    if crop.size == 0: continue
-                    
-                    crop = apply_clahe(crop)
-                    
-                    name_without_ext = os.path.splitext(file_name)[0]
-                    save_name = f"{name_without_ext}_h_{i}.png"
-                    save_path = os.path.join(save_dir, save_name)
-                    
-                    cv2.imwrite(save_path, crop)
-                    total_healthy += 1
+            with open(json_path, 'r') as f:
+                data = json.load(f)
+
+            # Ground Truth Kutularını Hazırla
+            gt_boxes_map = {}
+            file_to_id = {}
+            for img in data['images']:
+                file_to_id.setdefault(img['file_name'], img['id'])
+
+            for ann in data['annotations']:
+                img_id = ann['image_id']
+                if img_id not in gt_boxes_map:
+                    gt_boxes_map[img_id] = []
+                gt_boxes_map[img_id].append(ann['bbox']) # [x, y, w, h]
+
+            save_dir = os.path.join(OUTPUT_DIR, split, "Healthy")
+            os.makedirs(save_dir, exist_ok=True)
+
+            valid_extensions = ('.PNG')
+            img_files = sorted(os.path.join(img_dir, f) for f in os.listdir(img_dir) if f.endswith(valid_extensions))
+
+            # Daha önce işlenmiş (aynı resim, aynı GT, aynı model) dosyaları atla
+            tasks = []
+            for img_path in img_files:
+                file_name = os.path.basename(img_path)
+                known_diseases = gt_boxes_map.get(file_to_id.get(file_name), [])
+                task = {
+                    "id": f"{split}/{file_name}",
+                    "digest": task_digest(file_stat(img_path), known_diseases, model_sig, CONF,
+                                          [CLAHE_CLIP, CLAHE_TILE, KEEP_GRAY]),
+                    "path": img_path,
+                    "file_name": file_name,
+                    "known_diseases": xywh_to_xyxy(np.array(known_diseases, dtype=float)),
+                }
+                if manifest.is_done(task["id"], task["digest"]):
+                    total_healthy += manifest.result(task["id"])
+                    continue
+                tasks.append(task)
+
+            for start in range(0, len(tasks), BATCH_SIZE):
+                chunk = tasks[start:start + BATCH_SIZE]
+
+                # Görüntüleri oku (tek decode: hem inference hem crop için)
+                images = list(pool.map(cv2.imread, [t["path"] for t in chunk]))
+                valid = [(t, img) for t, img in zip(chunk, images) if img is not None]
+                if not valid: continue
+
+                results = _predict_chunk(model, [img for _, img in valid])
+
+                jobs = []
+                for (task, img), res in zip(valid, results):
+                    if res is None: continue
+                    jobs.append((task, pool.submit(save_healthy_crops, img, res.boxes.xyxy.cpu().numpy(),
+                                                   task["known_diseases"], task["file_name"], save_dir)))
+
+                for task, job in jobs:
+                    outputs = job.result()
+                    # Yeniden taranan resmin artık üretilmeyen eski _h_ crop'larını sil (dataset_builder.build gibi)
+                    old = manifest.entries.get(task["id"], {}).get("outputs", [])
+                    for stale in set(old) - set(outputs):
+                        if os.path.exists(stale): os.remove(stale)
+                    manifest.mark(task["id"], task["digest"], outputs, len(outputs))
+                    total_healthy += len(outputs)
+                manifest.save()
 
     print(f"Bitti! Toplam {total_healthy} adet Healthy diş klasörlere eklendi.")
 
+    # Yeni Healthy crop'larla paketi güncelle (değişmeyen crop'lar tekrar decode edilmez)
+    if PACK_STORE:
+        pack_dataset(OUTPUT_DIR)
+
 if __name__ == "__main__":
-    mine_healthy_teeth()
\ No newline at end of file
+    mine_healthy_teeth()
@@ -1,7 +1,10 @@
 import json, os, shutil, cv2
 import numpy as np
 from pathlib import Path
-from stage2_prepare import apply_clahe
+from preprocess import apply_clahe_batch, CLAHE_CLIP, CLAHE_TILE
+from dataset_builder import build, file_stat, task_digest, atomic_imwrite, WORKERS
+from box_ops import clip_xywh
+from crop_store import pack_dataset
 
 datasets = [
     {
@@ -18,6 +21,13 @@ datasets = [
 ] 
 
 OUTPUT_DIR = "../data/processed/stage3_classifier"
+MANIFEST_PATH = f"{OUTPUT_DIR}/.manifest.json"
+
+# Crop klasörlerini eğitim için tek memmap pakete de çevir (crop_store.py)
+PACK_STORE = True
+
+# Crop'ları tek kanallı PNG olarak yaz (1/3 disk; okurken cv2.imread yine 3 kanala açar)
+KEEP_GRAY = False
 
 DISEASE_MAP = {
     0: "Impacted",
@@ -32,7 +42,33 @@ def setup_directories ():
         for name in DISEASE_MAP.values():
             os.makedirs(f"{OUTPUT_DIR}/{split}/{name}", exist_ok=True)
 
-def process_dataset(info):
+# Tek resmi işler: resim bir kez decode edilir, tüm annotation crop'ları çıkarılır (worker process içinde çalışır)
+def process_image(task):
+    outputs, labels = [], []
+
+    img = cv2.imread(task["src_path"])
+    if img is None: return {"outputs": outputs, "result": labels}
+    h_img, w_img = img.shape[:2]
+
+    anns = task["anns"]
+    boxes = clip_xywh(np.array([ann["bbox"] for ann in anns], dtype=float).astype(int), w_img, h_img)
+
+    valid, crops = [], []
+    for ann, (x, y, w, h) in zip(anns, boxes.tolist()):
+        crop = img[y:y+h, x:x+w]
+        if crop.size == 0: continue
+        valid.append(ann)
+        crops.append(crop)
+
+    # CLAHE tüm crop'lara tek seferde (aynı CLAHE nesnesi)
+    for ann, crop in zip(valid, apply_clahe_batch(crops, keep_gray=KEEP_GRAY)):
+        atomic_imwrite(ann["save_path"], crop)
+        outputs.append(ann["save_path"])
+        labels.append(ann["label"])
+
+    return {"outputs": outputs, "result": labels}
+
+def process_dataset(info, workers=WORKERS):
     split = info["split"]
     img_dir = info["img_dir"]
     json_path = info["json_path"]
@@ -45,14 +81,12 @@ def process_dataset(info):
     stats = {k: 0 for k in DISEASE_MAP.values()}
     stats['Healthy'] = 0
 
+    # Annotation'ları resme göre grupla (her resim tek iş)
+    grouped = {}
     for ann in data['annotations']:
         img_id = ann['image_id']
         file_name = images_map.get(img_id)
         if not file_name : continue
-
-        src_path =f"{img_dir}/{file_name}"
-        if not os.path.exists(src_path): 
-            continue
         
         disease_id = ann.get('category_id_3')
 
@@ -61,24 +95,30 @@ def process_dataset(info):
         else:
             label = "Healthy"
 
-        img = cv2.imread(src_path)
-        if img is None: continue
-        
-        x, y, w, h = map(int, ann['bbox'])
-        h_img, w_img = img.shape[:2]
-        x = max(0, x); y = max(0, y)
-        w = min(w, w_img - x); h = min(h, h_img - y)
-        
-        crop = img[y:y+h, x:x+w]
-        if crop.size == 0: continue
+        save_name = f"{Path(file_name).stem}_{ann['id']}.png"
+        grouped.setdefault(file_name, []).append({
+            "bbox": ann['bbox'],
+            "label": label,
+            "save_path": f"{OUTPUT_DIR}/{split}/{label}/{save_name}",
+        })
+
+    params = {"clahe_clip": CLAHE_CLIP, "clahe_tile": CLAHE_TILE, "keep_gray": KEEP_GRAY}
+    tasks = []
+    for file_name, anns in grouped.items():
+        src_path =f"{img_dir}/{file_name}"
+        if not os.path.exists(src_path): 
+            continue
 
-        crop = apply_clahe(crop)
+        tasks.append({
+            "id": f"{split}/{file_name}",
+            "digest": task_digest(file_stat(src_path), anns, params),
+            "src_path": src_path,
+            "anns": anns,
+        })
 
-        save_name = f"{Path(file_name).stem}_{ann['id']}.png"
-        save_path = f"{OUTPUT_DIR}/{split}/{label}/{save_name}"
-        
-        cv2.imwrite(save_path, crop)
-        stats[label] += 1
+    for labels in build(tasks, process_image, MANIFEST_PATH, workers=workers, desc=split, scope=f"{split}/"):
+        for label in labels or []:
+            stats[label] += 1
 
     print(f"📊 {split.upper()} Raporu:")
     for k, v in stats.items():
@@ -88,7 +128,9 @@ def main():
     setup_directories()
     for ds in datasets:
         process_dataset(ds)
+    if PACK_STORE:
+        pack_dataset(OUTPUT_DIR)
     print(f"\n✅ İşlem Tamam. Çıktı: {OUTPUT_DIR}")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
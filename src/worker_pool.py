@@ -0,0 +1,256 @@
+import os
+import gc
+import sys
+import time
+import queue
+import argparse
+import threading
+import multiprocessing as mp
+import cv2
+
+from main_pipeline import load_models, warmup, analyze_batch, resolve_options, merge_stats, STAGE3_BATCH_SIZE
+
+# Çok çekirdekli CPU sunucuları için süreç havuzu.
+# Tek süreçte GIL ve torch'un intra-op ölçeklenmesi 32 çekirdeği dolduramıyor; burada N worker süreci
+# her biri kendi çekirdek grubunda, kendi torch thread sayısıyla analyze_batch çalıştırır.
+#
+# Modeller ana süreçte bir kez yüklenip ısıtılır, sonra fork edilir: ağırlık tensörleri copy-on-write
+# paylaşılır (yalnızca okunduğu için kopyalanmaz). gc.freeze() ile GC'nin nesne başlıklarına dokunup
+# sayfaları kopyalatması da engellenir. Ek olarak torch modülleri share_memory() ile paylaşımlı belleğe alınır.
+#
+# İşler tek bir ortak kuyrukta küçük parçalar (chunk) halinde durur; boşalan worker sıradakini çeker
+# (iş çalma ile aynı yük dengesi). Worker'lara resim değil dosya yolu gider, decode worker'da yapılır.
+
+CHUNK_SIZE = 4        # Bir işte kaç resim (analyze_batch'e birlikte girer)
+QUEUE_PER_WORKER = 4  # Kuyrukta worker başına en fazla bu kadar iş bekler
+
+_STOP = None
+
+# fork öncesi ana süreçte doldurulur; worker'lar miras alır (pickle edilmez)
+_shared = {}
+
+
+def available_cores():
+    """Bu sürecin çalışabileceği çekirdekler (cgroup / taskset kısıtları dahil)."""
+    if hasattr(os, "sched_getaffinity"):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+
+def plan_workers(n_workers=None, threads=None, cores=None):
+    """
+    Çekirdekleri worker'lara böler: worker başına (çekirdek listesi, torch thread sayısı).
+    n_workers verilmezse çekirdek / threads (threads varsayılanı 2).
+    """
+    cores = cores or available_cores()
+    threads = threads or (max(1, len(cores) // n_workers) if n_workers else 2)
+    n_workers = n_workers or max(1, len(cores) // threads)
+    per = max(1, len(cores) // n_workers)
+    plan = []
+    for i in range(n_workers):
+        subset = cores[i * per:(i + 1) * per] or [cores[i % len(cores)]]
+        plan.append((subset, min(threads, len(subset))))
+    return plan
+
+
+def share_models(models):
+    """PyTorch modellerinin ağırlıklarını paylaşımlı belleğe taşır (ONNX / OpenVINO modelleri olduğu gibi kalır)."""
+    import torch
+    for model in models.values():
+        net = getattr(model, "model", None)
+        if isinstance(net, torch.nn.Module):
+            net.share_memory()
+    return models
+
+
+def pss_mb(pid):
+    """Sürecin orantılı bellek kullanımı (paylaşılan sayfalar süreç sayısına bölünür). Linux dışında None."""
+    try:
+        with open(f"/proc/{pid}/smaps_rollup") as f:
+            for line in f:
+                if line.startswith("Pss:"):
+                    return round(int(line.split()[1]) / 1024, 1)
+    except OSError:
+        return None
+
+
+def _worker_main(worker_id, cores, threads, tasks, results):
+    import torch
+    if hasattr(os, "sched_setaffinity"):
+        os.sched_setaffinity(0, cores)
+    torch.set_num_threads(threads)
+    cv2.setNumThreads(1)
+
+    models, options = _shared["models"], _shared["options"]
+    batch_size = _shared["stage3_batch_size"]
+    while True:
+        chunk = tasks.get()
+        if chunk is _STOP: break
+
+        stats = {}
+        start = time.perf_counter()
+        try:
+            images = [cv2.imread(path) for _, path in chunk]
+            readable = [img for img in images if img is not None]
+            outputs = iter(analyze_batch(readable, models, batch_size, options, stats))
+            done = [(idx, path, next(outputs) if img is not None else [], None)
+                    for (idx, path), img in zip(chunk, images)]
+        except Exception as e:
+            done = [(idx, path, [], str(e)) for idx, path in chunk]
+        results.put((worker_id, done, stats, time.perf_counter() - start))
+
+
+class WorkerPool:
+    """
+    analyze_batch'i N süreçte çalıştırır.
+      with WorkerPool(n_workers=8, threads=4) as pool:
+          for path, pathologies, error in pool.map(paths): ...
+    models verilmezse load_models(backend) ile bir kez yüklenir. fork gerektirir (Linux / macOS).
+    """
+
+    def __init__(self, n_workers=None, threads=None, models=None, backend=None, options=None,
+                 chunk_size=CHUNK_SIZE, stage3_batch_size=STAGE3_BATCH_SIZE):
+        self.plan = plan_workers(n_workers, threads)
+        self.models = models
+        self.backend = backend
+        self.options = resolve_options(options)
+        self.chunk_size = chunk_size
+        self.stage3_batch_size = stage3_batch_size
+        self.processes = []
+        self.candidate_stats = {}
+        self.worker_images = [0] * len(self.plan)
+        self.worker_busy_s = [0.0] * len(self.plan)
+
+    def start(self):
+        import torch
+        ctx = mp.get_context("fork")
+
+        # Ana süreç çıkarım için thread havuzu kurmasın: fork sonrası OpenMP havuzu çocukta kilitlenebilir
+        torch.set_num_threads(1)
+        if self.models is None:
+            self.models = load_models(self.backend)
+        warmup(self.models)  # predictor'lar (birleştirilmiş katmanlar) fork'tan önce kurulur, kopyalanmaz
+        share_models(self.models)
+
+        _shared.update(models=self.models, options=self.options, stage3_batch_size=self.stage3_batch_size)
+        self.tasks = ctx.Queue(maxsize=QUEUE_PER_WORKER * len(self.plan))
+        self.results = ctx.Queue()
+
+        gc.collect()
+        gc.freeze()
+        try:
+            for worker_id, (cores, threads) in enumerate(self.plan):
+                p = ctx.Process(target=_worker_main, args=(worker_id, cores, threads, self.tasks, self.results),
+                                name=f"tooth-worker-{worker_id}", daemon=True)
+                p.start()
+                self.processes.append(p)
+        finally:
+            gc.unfreeze()
+        return self
+
+    def close(self):
+        for _ in self.processes:
+            self.tasks.put(_STOP)
+        for p in self.processes:
+            p.join()
+        self.processes = []
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _feed(self, chunks):
+        for chunk in chunks:
+            self.tasks.put(chunk)
+
+    def map(self, image_paths, ordered=True):
+        """
+        Resimleri worker'lara dağıtır, (yol, bulgular, hata) üretir (generator). ordered=True ise girdi sırasıyla.
+        hata: resmin parçası analiz edilemediyse mesajı, yoksa None (bulgular o zaman boş liste).
+        """
+        if not self.processes:
+            raise RuntimeError("Havuz başlatılmadı (start() ya da with kullanın)")
+        indexed = list(enumerate(image_paths))
+        chunks = [indexed[i:i + self.chunk_size] for i in range(0, len(indexed), self.chunk_size)]
+        feeder = threading.Thread(target=self._feed, args=(chunks,), daemon=True)
+        feeder.start()
+
+        pending, next_idx = {}, 0
+        for _ in range(len(chunks)):
+            while True:
+                try:
+                    worker_id, done, stats, busy = self.results.get(timeout=5)
+                    break
+                except queue.Empty:
+                    dead = [p.name for p in self.processes if not p.is_alive()]
+                    if dead:
+                        raise RuntimeError(f"Worker süreçleri beklenmedik şekilde kapandı: {dead}")
+
+            merge_stats(self.candidate_stats, stats)
+            self.worker_images[worker_id] += len(done)
+            self.worker_busy_s[worker_id] += busy
+            for idx, path, pathologies, error in done:
+                if not ordered:
+                    yield path, pathologies, error
+                    continue
+                pending[idx] = (path, pathologies, error)
+            while next_idx in pending:
+                yield pending.pop(next_idx)
+                next_idx += 1
+        feeder.join()
+
+    def metrics(self):
+        """Worker başına çekirdekler, işlenen resim, meşgul süre ve PSS (paylaşılan sayfalar bölünmüş)."""
+        report = {}
+        for worker_id, ((cores, threads), p) in enumerate(zip(self.plan, self.processes)):
+            report[p.name] = {
+                "cores": f"{cores[0]}-{cores[-1]}",
+                "threads": threads,
+                "images": self.worker_images[worker_id],
+                "busy_s": round(self.worker_busy_s[worker_id], 3),
+                "pss_mb": pss_mb(p.pid),
+            }
+        report["parent_pss_mb"] = pss_mb(os.getpid())
+        report["candidates"] = dict(self.candidate_stats)
+        return report
+
+
+def parse_args(argv=None):
+    p = argparse.ArgumentParser(description="Çok süreçli toplu analiz")
+    p.add_argument("input_dir", help="Resim klasörü")
+    p.add_argument("--workers", type=int, default=None, help="Worker süreç sayısı (varsayılan: çekirdek / threads)")
+    p.add_argument("--threads", type=int, default=None, help="Worker başına torch thread sayısı")
+    p.add_argument("--chunk-size", type=int, default=CHUNK_SIZE, help="Bir işteki resim sayısı")
+    p.add_argument("--backend", default=None, help="pytorch / onnx / openvino / openvino_int8")
+    return p.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    paths = sorted(os.path.join(args.input_dir, f) for f in os.listdir(args.input_dir)
+                   if f.lower().endswith(('.png', '.jpg', '.jpeg')))
+    if not paths:
+        print("❌ Klasörde resim yok.")
+        sys.exit(1)
+
+    with WorkerPool(args.workers, args.threads, backend=args.backend, chunk_size=args.chunk_size) as pool:
+        print(f"🚀 {len(pool.plan)} worker x {pool.plan[0][1]} thread, {len(paths)} resim")
+        start = time.perf_counter()
+        total, failed = 0, 0
+        for path, pathologies, error in pool.map(paths):
+            if error:
+                failed += 1
+                print(f"❌ Hata ({os.path.basename(path)}): {error}")
+            total += len(pathologies)
+        elapsed = time.perf_counter() - start
+
+        print(f"\n✅ {len(paths)} resim, {total} bulgu, {failed} hatalı, {elapsed:.1f} sn "
+              f"({len(paths) / elapsed:.2f} resim/sn)")
+        for name, m in pool.metrics().items():
+            print(f"   {name}: {m}")
+
+
+if __name__ == "__main__":
+    main()